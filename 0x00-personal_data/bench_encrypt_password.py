@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the batch bcrypt APIs
+
+hashes and verifies the same passwords with 1 to N threads, at the cost
+factor BCRYPT_ROUNDS
+usage: ./bench_encrypt_password.py [number of passwords] [max threads]
+"""
+import os
+import sys
+import time
+
+from encrypt_password import BCRYPT_ROUNDS, hash_passwords, verify_many
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    passwords = ["password{}".format(i) for i in range(count)]
+    print("{} passwords, {} rounds, {} CPUs".format(
+        count, BCRYPT_ROUNDS, os.cpu_count()))
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        hashed = hash_passwords(passwords, workers)
+        hashing = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        assert all(verify_many(zip(hashed, passwords), workers))
+        verifying = count / (time.perf_counter() - start)
+        print("{} thread(s): {:.1f} hashes/s, {:.1f} checks/s".format(
+            workers, hashing, verifying))
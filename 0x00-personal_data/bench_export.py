@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the export of the users table
+
+exports a SQLite stand-in of the users table, with the columns of the
+MySQL one, with 1 to N worker processes, and checks that every run
+writes the same lines as the serial export
+usage: ./bench_export.py [number of rows] [max number of workers]
+"""
+import io
+import os
+import sqlite3
+import sys
+
+from filtered_logger import export
+
+
+def users_fixture(count: int) -> sqlite3.Connection:
+    """returns an in-memory users table of count rows"""
+    database = sqlite3.connect(":memory:")
+    database.execute("CREATE TABLE users (name VARCHAR(256), "
+                     "email VARCHAR(256), phone VARCHAR(16), "
+                     "ssn VARCHAR(16), password VARCHAR(256), "
+                     "ip VARCHAR(64), last_login TIMESTAMP, "
+                     "user_agent VARCHAR(512))")
+    database.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (("user{}".format(i), "user{}@mail.com".format(i),
+          "(555) 555-{:04d}".format(i % 10000),
+          "123-45-{:04d}".format(i % 10000), "pass{}".format(i),
+          "10.0.{}.{}".format(i // 256 % 256, i % 256),
+          "2019-11-14 06:14:24", "Mozilla/5.0")
+         for i in range(count)))
+    return database
+
+
+def messages(output: str) -> list:
+    """returns the lines of an export without their timestamps"""
+    return [line.split(": ", 1)[1] for line in output.splitlines()]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    database = users_fixture(count)
+    print("{} rows, {} CPUs".format(count, os.cpu_count()))
+    expected = None
+    for workers in range(1, max_workers + 1):
+        for ordered in (True, False) if workers > 1 else (True,):
+            sink = io.StringIO()
+            stats = export(database, sink, workers=workers, ordered=ordered)
+            lines = messages(sink.getvalue())
+            if expected is None:
+                expected = lines
+            elif ordered:
+                assert lines == expected
+            else:
+                assert sorted(lines) == sorted(expected)
+            print("{} worker(s){}: {:.0f} rows/s".format(
+                workers, "" if ordered else ", unordered",
+                stats["rows_per_second"]))
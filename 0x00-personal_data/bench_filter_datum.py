@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark of filter_datum
+
+compares the single-pass compiled filter_datum with the former one,
+which ran one re.sub per field
+usage: ./bench_filter_datum.py [number of lines]
+"""
+import re
+import sys
+import time
+from typing import List
+
+from filtered_logger import PII_FIELDS, filter_datum
+
+
+def filter_datum_per_field(fields: List[str], redaction: str,
+                           message: str, separator: str) -> str:
+    """returns the log message obfuscated, one re.sub per field"""
+    for field in fields:
+        message = re.sub(field+'=.*?'+separator,
+                         field+'='+redaction+separator, message)
+    return message
+
+
+def measure(function, messages: List[str]) -> float:
+    """returns the lines per second redacted by function"""
+    start = time.perf_counter()
+    for message in messages:
+        function(PII_FIELDS, "***", message, ";")
+    return len(messages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    messages = [
+        "name=user{0};email=user{0}@mail.com;phone=(555) 555-{0:04d};"
+        "ssn=123-45-{0:04d};password=pass{0};ip=10.0.0.{1};"
+        "last_login=2019-11-14 06:14:24;user_agent=Mozilla/5.0;".format(
+            i, i % 256)
+        for i in range(count)]
+    for message in messages[:100]:
+        assert filter_datum(PII_FIELDS, "***", message, ";") == \
+            filter_datum_per_field(PII_FIELDS, "***", message, ";")
+    before = measure(filter_datum_per_field, messages)
+    after = measure(filter_datum, messages)
+    print("{} lines, {} fields".format(count, len(PII_FIELDS)))
+    print("one re.sub per field: {:.0f} lines/s".format(before))
+    print("single pass: {:.0f} lines/s".format(after))
+    print("speedup: {:.1f}x".format(after / before))
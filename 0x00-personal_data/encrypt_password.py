@@ -1,20 +1,76 @@
 #!/usr/bin/env python3
 """ ENCRIPT PASSWORD MODULE"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+import os
+import time
 import bcrypt
 from bcrypt import hashpw
 
 
-def hash_password(password: str) -> bytes:
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     returns a hashed password
     Arguments:
         password: password to hash
+        rounds: cost factor of the hash, BCRYPT_ROUNDS by default
     """
     b = password.encode()
-    hashed = hashpw(b, bcrypt.gensalt())
+    hashed = hashpw(b, bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
     return hashed
 
 
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    returns the cost factor of a hashed password
+    arguments:
+        hashed_password: bytes type, as $2b$<rounds>$<salt and hash>
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    returns whether a hashed password was hashed with another cost factor
+    arguments:
+        hashed_password: bytes type
+        rounds: expected cost factor, BCRYPT_ROUNDS by default
+    """
+    return hash_rounds(hashed_password) != (rounds or BCRYPT_ROUNDS)
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = 4,
+                     max_rounds: int = 31) -> int:
+    """
+    returns the highest cost factor whose hash takes at most target_ms
+    milliseconds on this machine, min_rounds at least
+    each round doubles the work, so the time of a few cheap hashes is
+    extrapolated instead of timing the expensive ones
+    arguments:
+        target_ms: time budget of one hash, in milliseconds
+        min_rounds: lowest cost factor returned
+        max_rounds: highest cost factor returned
+    """
+    probe_rounds = 8
+    samples = 5
+    salt = bcrypt.gensalt(probe_rounds)
+    start = time.perf_counter()
+    for i in range(samples):
+        hashpw(b"calibration", salt)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / samples
+    rounds = probe_rounds
+    while rounds > min_rounds and elapsed_ms > target_ms:
+        rounds -= 1
+        elapsed_ms /= 2
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return max(rounds, min_rounds)
+
+
 def is_valid(hashed_password: bytes, password: str) -> bool:
     """
     returns a boolean
@@ -23,3 +79,31 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         password: string type
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def hash_passwords(passwords: Iterable[str], workers: int = None,
+                   rounds: int = None) -> List[bytes]:
+    """
+    returns the hashed passwords, in order
+    bcrypt releases the GIL while hashing, so the passwords are hashed by
+    a pool of threads, one per CPU by default
+    Arguments:
+        passwords: passwords to hash
+        workers: number of threads
+        rounds: cost factor of the hashes, BCRYPT_ROUNDS by default
+    """
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        return list(executor.map(lambda password: hash_password(
+            password, rounds), passwords))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                workers: int = None) -> List[bool]:
+    """
+    returns whether each password matches its hashed password, in order
+    arguments:
+        pairs: (hashed_password, password) tuples
+        workers: number of threads, one per CPU by default
+    """
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        return list(executor.map(lambda pair: is_valid(*pair), pairs))
@@ -3,33 +3,115 @@
 filter_logger module that obfuscates fields in a log message
 """
 import re
-from typing import List
+from functools import lru_cache
+from typing import Callable, List, Tuple
+import argparse
+import atexit
+import collections
+import concurrent.futures
+import copy
+import functools
 import logging
+import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
 import mysql.connector
 
 
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
 
 
+@lru_cache(maxsize=128)
+def redaction_pattern(fields: Tuple[str], separator: str) -> re.Pattern:
+    """
+    returns the pattern matching any of the fields with its value, up to
+    the separator, compiled once per (fields, separator)
+    a field name must not follow a word character, so name= doesn't
+    match inside username=
+    arguments:
+        fields: strings indicating fields to obfuscate
+        separator: character separating the fields
+    """
+    names = "|".join(re.escape(field) for field in fields)
+    return re.compile(r"(?<!\w)({})=.*?{}".format(
+        names, re.escape(separator)))
+
+
+@lru_cache(maxsize=128)
+def redactor(fields: Tuple[str], separator: str) -> Callable:
+    """
+    returns the function redacting the fields of a message, built once
+    per (fields, separator)
+    the message is split on the separator and the key of each field is
+    looked up in a set, which is much faster than matching a regex at
+    every position; a key only matches a field at a word boundary, like
+    the pattern, so username= isn't redacted as name=
+    messages spanning several lines, where a value can't run past the end
+    of a line, and fields whose value holds another =, which may hide a
+    field, go through redaction_pattern instead
+    arguments:
+        fields: strings indicating fields to obfuscate
+        separator: character separating the fields
+    """
+    names = frozenset(fields)
+    pattern = redaction_pattern(fields, separator)
+    last_word = re.compile(r"\w+$")
+
+    def replacement(redaction: str) -> Callable:
+        """returns the replacement of the matches of the pattern"""
+        return lambda match: match.group(1) + "=" + redaction + separator
+
+    def redact(redaction: str, message: str) -> str:
+        """returns the message with the values of the fields redacted"""
+        if separator == "" or "\n" in message:
+            return pattern.sub(replacement(redaction), message)
+        parts = message.split(separator)
+        for i in range(len(parts) - 1):
+            key, equal, value = parts[i].partition("=")
+            if not equal:
+                continue
+            if "=" in value:
+                part = pattern.sub(replacement(redaction),
+                                   parts[i] + separator)
+                parts[i] = part[:-len(separator)]
+                continue
+            if key not in names:
+                word = key.lstrip()
+                if word not in names:
+                    if word.isidentifier():
+                        continue
+                    word = last_word.search(word)
+                    if word is None or word.group() not in names:
+                        continue
+            parts[i] = key + "=" + redaction
+        return separator.join(parts)
+    return redact
+
+
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """
-    returns the log message obfuscated
+    returns the log message obfuscated, in a single pass over the message
     arguments:
         fields: strings indicating fields to obfuscate
         redaction :field will be obfuscated to
         message: line to obfuscate
         separator: character separating the fields
     """
-    for field in fields:
-        message = re.sub(field+'=.*?'+separator,
-                         field+'='+redaction+separator, message)
-    return message
+    return redactor(tuple(fields), separator)(redaction, message)
 
 
 class RedactingFormatter(logging.Formatter):
-    """Redacting Formatter class that inherits from logging.Formatter"""
+    """Redacting Formatter class that inherits from logging.Formatter
+
+    a record logged with extra={"fields": {key: value}} is structured: its
+    fields are rendered after its message as "key=value;" pairs, the value
+    of a field to obfuscate being replaced while rendering, so the line
+    isn't scanned for the fields afterwards
+    """
 
     REDACTION = "***"
     FORMAT = ("[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: "
@@ -40,19 +122,95 @@ class RedactingFormatter(logging.Formatter):
         """Redacting Formatter constructor"""
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self._redacted = frozenset(fields)
+
+    def render_fields(self, fields: dict) -> str:
+        """returns the fields as key=value pairs, obfuscated"""
+        return " ".join(
+            "{}={}{}".format(
+                k, self.REDACTION if k in self._redacted else v,
+                self.SEPARATOR)
+            for k, v in fields.items())
 
     def format(self, record: logging.LogRecord) -> str:
         """filter values in incoming log records using filter_datum
         args: record: log record
         """
-        sms = super(RedactingFormatter, self).format(record)
-        red = filter_datum(self.fields, self.REDACTION, sms, self.SEPARATOR)
-        return red
+        fields = getattr(record, "fields", None)
+        if fields is None:
+            sms = super(RedactingFormatter, self).format(record)
+            return filter_datum(self.fields, self.REDACTION, sms,
+                                self.SEPARATOR)
+        message = record.getMessage()
+        rendered = self.render_fields(fields)
+        message = message + " " + rendered if message else rendered
+        if record.exc_info or record.exc_text or record.stack_info:
+            record = copy.copy(record)
+            record.msg, record.args, record.fields = message, None, None
+            return self.format(record)
+        record.message = message
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        return self.formatMessage(record)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler enqueuing the records for a QueueListener
+
+    the records are enqueued as they are, so the redaction and the write
+    happen on the thread of the listener; when the queue is full, a record
+    is dropped with the "drop" policy, or waits for room with "block"
+    """
+
+    def __init__(self, max_size: int = 10000, policy: str = "block"):
+        """BoundedQueueHandler constructor"""
+        if policy not in ("block", "drop"):
+            raise ValueError("policy must be 'block' or 'drop'")
+        super(BoundedQueueHandler, self).__init__(queue.Queue(max_size))
+        self.policy = policy
+        self.enqueued = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.listener = None
+        self._counters_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """returns the record unformatted, it's formatted by the listener"""
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """enqueues the record following the policy of the handler"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._counters_lock:
+                if self.policy == "drop":
+                    self.dropped += 1
+                    return
+                self.blocked += 1
+            self.queue.put(record)
+        with self._counters_lock:
+            self.enqueued += 1
+
+    def stats(self) -> dict:
+        """returns the counters of the handler"""
+        with self._counters_lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_size": self.queue.maxsize,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "blocked": self.blocked,
+            }
 
 
 def get_logger() -> logging.Logger:
     """
     definition that takes no arguments and returns a logging.Logger object
+    with PERSONAL_DATA_LOG_ASYNC set, records are only enqueued by the
+    caller, and redacted and written by a background QueueListener; the
+    queue holds PERSONAL_DATA_LOG_QUEUE_SIZE records (default 10000) and
+    PERSONAL_DATA_LOG_QUEUE_POLICY ("block" or "drop") applies when full
     """
     log = logging.getLogger("user_data")
     log.setLevel(logging.INFO)
@@ -63,35 +221,342 @@ def get_logger() -> logging.Logger:
     formatter = RedactingFormatter(PII_FIELDS)
 
     handler.setFormatter(formatter)
+    if os.getenv('PERSONAL_DATA_LOG_ASYNC') in ("1", "true", "True"):
+        queue_handler = BoundedQueueHandler(
+            int(os.getenv('PERSONAL_DATA_LOG_QUEUE_SIZE', 10000)),
+            os.getenv('PERSONAL_DATA_LOG_QUEUE_POLICY', "block"))
+        queue_handler.listener = logging.handlers.QueueListener(
+            queue_handler.queue, handler, respect_handler_level=True)
+        queue_handler.listener.start()
+        atexit.register(queue_handler.listener.stop)
+        handler = queue_handler
     log.addHandler(handler)
     return log
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
-    """returns a connector to the database"""
-    user = os.getenv('PERSONAL_DATA_DB_USERNAME', "root")
-    passwd = os.getenv('PERSONAL_DATA_DB_PASSWORD', "")
-    host = os.getenv('PERSONAL_DATA_DB_HOST', "localhost")
-    database_name = os.getenv('PERSONAL_DATA_DB_NAME')
-    conector = mysql.connector.connect(
-        user=user,
-        password=passwd,
-        host=host,
-        database=database_name
-    )
-    return conector
+class PooledConnection():
+    """Connection checked out of a ConnectionPool
+
+    it forwards everything to the connection, except close(), which gives
+    the connection back to the pool
+    """
+
+    def __init__(self, pool: "ConnectionPool", connection):
+        """PooledConnection constructor"""
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str):
+        """returns the attribute of the connection"""
+        if self._connection is None:
+            raise AttributeError("connection returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        """gives the connection back to the pool"""
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+
+class ConnectionPool():
+    """Pool of connections made by source
+
+    at most size connections are checked out at a time, get() waits up to
+    timeout seconds for one to come back; an idle connection is checked
+    before being handed out, and closed once idle for max_idle seconds
+    """
+
+    def __init__(self, source: Callable, size: int = 5,
+                 max_idle: float = 300, timeout: float = 30):
+        """ConnectionPool constructor"""
+        self.source = source
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @staticmethod
+    def is_alive(connection) -> bool:
+        """checks that the connection still answers"""
+        try:
+            if hasattr(connection, "ping"):
+                connection.ping()
+            else:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(connection):
+        """closes a connection leaving the pool"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _evict(self):
+        """closes the connections idle for more than max_idle seconds"""
+        expired = []
+        limit = time.monotonic() - self.max_idle
+        with self._lock:
+            while self._idle and self._idle[0][1] < limit:
+                expired.append(self._idle.popleft()[0])
+        for connection in expired:
+            self._discard(connection)
+
+    def get(self) -> PooledConnection:
+        """returns an idle connection that answers, or a new one"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("no connection available in the pool")
+        try:
+            self._evict()
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection = self._idle.pop()[0]
+                if self.is_alive(connection):
+                    return PooledConnection(self, connection)
+                self._discard(connection)
+            return PooledConnection(self, self.source())
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        """takes back a connection, rolling back what it left open"""
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+        self._evict()
 
+    def close(self):
+        """closes the idle connections"""
+        with self._lock:
+            idle = [connection for connection, used in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+
+def mysql_source() -> Callable:
+    """returns the function connecting to the database of the environment"""
+    return functools.partial(
+        mysql.connector.connect,
+        user=os.getenv('PERSONAL_DATA_DB_USERNAME', "root"),
+        password=os.getenv('PERSONAL_DATA_DB_PASSWORD', ""),
+        host=os.getenv('PERSONAL_DATA_DB_HOST', "localhost"),
+        database=os.getenv('PERSONAL_DATA_DB_NAME'))
+
+
+DB_POOL = None
+
+
+def configure_db(source: Callable = None) -> ConnectionPool:
+    """
+    replaces the pool of get_db with a pool of connections made by source,
+    mysql_source() by default
+    the pool holds PERSONAL_DATA_DB_POOL_SIZE connections (default 5),
+    closed after PERSONAL_DATA_DB_POOL_MAX_IDLE idle seconds (default 300)
+    """
+    global DB_POOL
+    if DB_POOL is not None:
+        DB_POOL.close()
+    DB_POOL = ConnectionPool(
+        source if source is not None else mysql_source(),
+        int(os.getenv('PERSONAL_DATA_DB_POOL_SIZE', 5)),
+        float(os.getenv('PERSONAL_DATA_DB_POOL_MAX_IDLE', 300)))
+    return DB_POOL
+
+
+def get_db() -> PooledConnection:
+    """
+    returns a connector to the database, out of the pool of configure_db
+    closing it gives it back to the pool
+    """
+    if DB_POOL is None:
+        configure_db()
+    return DB_POOL.get()
+
+
+def users_query(columns: List[str] = None, where: str = None) -> str:
+    """
+    returns the query selecting the columns of the users table
+    arguments:
+        columns: names of the columns to export, all of them if None
+        where: optional SQL condition on the rows, written by the operator
+    """
+    projection = "*"
+    if columns:
+        for column in columns:
+            if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", column) is None:
+                raise ValueError("invalid column name: {}".format(column))
+        projection = ", ".join("`{}`".format(column) for column in columns)
+    query = "SELECT {} FROM users".format(projection)
+    if where:
+        query += " WHERE {}".format(where)
+    return query + ";"
+
+
+def format_rows(fields: List[str], rows: List[tuple],
+                formatter: logging.Formatter) -> str:
+    """
+    returns the redacted log lines of a batch of rows, as log.info would
+    write them with the formatter
+    """
+    record = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                               "", None, None)
+    lines = []
+    for row in rows:
+        record.fields = dict(zip(fields, row))
+        lines.append(formatter.format(record))
+    lines.append("")
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=1)
+def batch_formatter() -> RedactingFormatter:
+    """returns the formatter of the batches of the current process"""
+    return RedactingFormatter(PII_FIELDS)
+
+
+def format_batch(fields: List[str], rows: List[tuple]) -> str:
+    """returns the redacted log lines of a batch, in a worker process"""
+    return format_rows(fields, rows, batch_formatter())
+
+
+def batches(cursor, batch_size: int):
+    """yields the rows of the cursor, batch_size rows at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_parallel(fields: List[str], rows_batches, sink, workers: int,
+                    ordered: bool = True) -> int:
+    """
+    writes the batches to sink once formatted and redacted by a pool of
+    worker processes, and returns the number of rows
+    the reader keeps at most two batches per worker in flight; with
+    ordered, the batches are written in the order they were read,
+    otherwise as soon as they're formatted
+    """
+    rows_count = 0
+    max_pending = 2 * workers
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        def write_next():
+            if ordered:
+                futures = [pending.popleft()]
+            else:
+                futures, not_done = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                pending.clear()
+                pending.extend(not_done)
+            for future in futures:
+                sink.write(future.result())
+
+        for rows in rows_batches:
+            pending.append(executor.submit(format_batch, fields, rows))
+            rows_count += len(rows)
+            if len(pending) >= max_pending:
+                write_next()
+        while pending:
+            write_next()
+    return rows_count
+
+
+def export(database, sink, batch_size: int = 1000,
+           columns: List[str] = None, where: str = None,
+           workers: int = 1, ordered: bool = True) -> dict:
+    """
+    streams the users table to sink, batch_size rows at a time, and
+    returns the number of rows, the duration and the rows per second
+    the rows are fetched with fetchmany from an unbuffered cursor, so only
+    a few batches are held client-side, and each batch is formatted,
+    redacted and written to the sink at once; with several workers, the
+    batches are formatted and redacted by a process pool, see
+    export_parallel
+    """
+    start = time.perf_counter()
+    rows_count = 0
+    cursor = database.cursor()
+    try:
+        cursor.execute(users_query(columns, where))
+        fields = [column[0] for column in cursor.description]
+        if workers > 1:
+            rows_count = export_parallel(fields, batches(cursor, batch_size),
+                                         sink, workers, ordered)
+        else:
+            formatter = RedactingFormatter(PII_FIELDS)
+            for rows in batches(cursor, batch_size):
+                sink.write(format_rows(fields, rows, formatter))
+                rows_count += len(rows)
+    finally:
+        cursor.close()
+    sink.flush()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows_count,
+        "seconds": seconds,
+        "rows_per_second": rows_count / seconds if seconds > 0 else 0.0,
+    }
+
+
+def main(argv: List[str] = None):
+    """reads and retrieves all rows in the users table
+
+    with --stream, the rows are exported in batches through a buffered
+    sink instead of one log.info per row, see export
+    """
+    parser = argparse.ArgumentParser(description="logs the users table")
+    parser.add_argument("--stream", action="store_true",
+                        help="export the rows in batches")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="rows fetched and written at a time")
+    parser.add_argument("--columns",
+                        help="comma separated columns to export")
+    parser.add_argument("--where", help="SQL condition on the rows")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes formatting and redacting the rows")
+    parser.add_argument("--unordered", action="store_true",
+                        help="write the batches as soon as they're ready")
+    args = parser.parse_args(argv)
 
-def main():
-    """reads and retrieves all rows in the users table"""
     database = get_db()
+    if args.stream:
+        columns = args.columns.split(",") if args.columns else None
+        sink = open(sys.stderr.fileno(), "w", buffering=2 ** 20,
+                    closefd=False)
+        try:
+            stats = export(database, sink, args.batch_size, columns,
+                           args.where, args.workers, not args.unordered)
+        finally:
+            sink.close()
+            database.close()
+        print("{} rows in {:.2f}s ({:.0f} rows/s)".format(
+            stats["rows"], stats["seconds"], stats["rows_per_second"]))
+        return
     log = get_logger()
     cursor = database.cursor()
     cursor.execute("SELECT * FROM users;")
     fields = cursor.column_names
     for row in cursor:
-        message = "".join("{}={}; ".format(k, v) for k, v in zip(fields, row))
-        log.info(message.strip())
+        log.info("", extra={"fields": dict(zip(fields, row))})
     cursor.close()
     database.close()
 
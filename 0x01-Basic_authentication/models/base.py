@@ -3,35 +3,82 @@
 """
 from datetime import datetime
 from typing import TypeVar, List, Iterable
-from os import path
-import json
+from os import getenv
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+STORAGE_TYPE = getenv("STORAGE_TYPE", "file")
+storage = None
+if STORAGE_TYPE == "memory":
+    from models.engine.memory_engine import MemoryEngine
+    storage = MemoryEngine()
+elif STORAGE_TYPE == "journal":
+    from models.engine.journal_engine import JournalEngine
+    storage = JournalEngine()
+elif STORAGE_TYPE == "sqlite":
+    from models.engine.sqlite_engine import SQLiteEngine
+    storage = SQLiteEngine()
+else:
+    from models.engine.file_engine import FileEngine
+    storage = FileEngine()
+
+
+class _LazyTimestamp():
+    """ Timestamp attribute kept in its string form until first accessed
+
+    the value is stored in the slot named after the attribute with a
+    leading underscore
+    """
+
+    def __set_name__(self, owner, name: str):
+        """ Stores the name of the attribute and of its slot
+        """
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, obj, objtype=None) -> datetime:
+        """ Returns the timestamp, parsing it on first access
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        """ Sets the timestamp
+        """
+        setattr(obj, self.slot, value)
 
 
 class Base():
-    """ Base class
+    """ Base class for all models
+
+    models declare their attributes in __slots__, so instances carry no
+    __dict__; a subclass without __slots__ still gets one and its extra
+    attributes are serialized too
+
+    the objects are stored by the engine chosen with STORAGE_TYPE: memory,
+    file (default), journal or sqlite; see models/engine
     """
+    __slots__ = ('id', '_created_at', '_updated_at')
+    INDEXED_ATTRIBUTES = ()
+    created_at = _LazyTimestamp()
+    updated_at = _LazyTimestamp()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,11 +91,32 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def _fields(cls) -> list:
+        """ Returns the (key, slot) of each slot of the class, in order
+        """
+        if '_FIELDS' not in cls.__dict__:
+            fields = []
+            for klass in reversed(cls.__mro__):
+                for slot in klass.__dict__.get('__slots__', ()):
+                    key = slot
+                    if isinstance(getattr(cls, slot[1:], None),
+                                  _LazyTimestamp):
+                        key = slot[1:]
+                    fields.append((key, slot))
+            cls._FIELDS = fields
+        return cls._FIELDS
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = []
+        for key, slot in self._fields():
+            if hasattr(self, slot):
+                items.append((key, getattr(self, slot)))
+        items.extend(getattr(self, '__dict__', {}).items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -61,52 +129,42 @@ class Base():
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        storage.load(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        storage.save_to_file(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage.remove(self)
+
+    @staticmethod
+    def flush():
+        """ Writes every pending mutation to the disk
+        """
+        storage.flush()
+
+    @classmethod
+    def compact(cls):
+        """ Compacts the storage of the class
+        """
+        storage.compact(cls)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +176,29 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage.get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = {},
+               limit: int = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        the most selective index is used first, and the search stops once
+        limit objects are found
+        """
+        return storage.search(cls, attributes, limit)
+
+    @classmethod
+    def first(cls, attributes: dict = {}) -> TypeVar('Base'):
+        """ Returns the first object with the given attributes, or None
+        """
+        objs = cls.search(attributes, 1)
+        if len(objs) == 0:
+            return None
+        return objs[0]
+
+    @classmethod
+    def exists(cls, attributes: dict = {}) -> bool:
+        """ Checks if an object has the given attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return len(cls.search(attributes, 1)) > 0
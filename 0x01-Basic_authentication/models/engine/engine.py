@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+""" The storage engine module
+"""
+from abc import ABC, abstractmethod
+from typing import List, TypeVar
+
+
+class Engine(ABC):
+    """ Storage engine of the models
+
+    Base forwards the storage of every model class to one engine, chosen
+    with STORAGE_TYPE in models/base.py; each method takes the model class
+    or the object it works on
+    """
+
+    @abstractmethod
+    def load(self, cls):
+        """ Loads the objects of the class from the disk
+        """
+        pass
+
+    @abstractmethod
+    def save_to_file(self, cls):
+        """ Writes all the objects of the class to the disk
+        """
+        pass
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')):
+        """ Stores the object
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')):
+        """ Removes the object
+        """
+        pass
+
+    @abstractmethod
+    def count(self, cls) -> int:
+        """ Returns the number of objects of the class
+        """
+        pass
+
+    @abstractmethod
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Returns the object of the class with the given id
+        """
+        pass
+
+    @abstractmethod
+    def search(self, cls, attributes: dict = {},
+               limit: int = None) -> List[TypeVar('Base')]:
+        """
+        returns the objects of the class matching the attributes, at most
+        limit of them
+        """
+        pass
+
+    def flush(self):
+        """ Writes every pending mutation to the disk
+        """
+        pass
+
+    def compact(self, cls):
+        """ Compacts the storage of the class
+        """
+        pass
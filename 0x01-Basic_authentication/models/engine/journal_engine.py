@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+""" The journal engine module
+"""
+import threading
+
+from models.engine.file_engine import FileEngine, _env
+
+
+class JournalEngine(FileEngine):
+    """ Storage engine appending each mutation to the journal of its class,
+    .db_<Class>.journal, instead of rewriting .db_<Class>.json
+
+    the journal is compacted into the file in the background once it
+    holds JOURNAL_COMPACT_THRESHOLD records
+    """
+    COMPACT_ON_LOAD = False
+
+    def __init__(self):
+        """ Constructor of the JournalEngine class
+        """
+        super().__init__()
+        self.compact_threshold = _env("JOURNAL_COMPACT_THRESHOLD", 10000)
+
+    def _persist(self, cls, record: dict):
+        """ Appends one mutation of the class to its journal
+        """
+        journal = self.journal(cls)
+        journal.append(record)
+        if journal.records >= self.compact_threshold and \
+                not journal.compacting:
+            journal.compacting = True
+            threading.Thread(target=self.compact, args=(cls,)).start()
+
+    def _write(self, cls):
+        """ Nothing to write, the journal is appended by _persist
+        """
+        pass
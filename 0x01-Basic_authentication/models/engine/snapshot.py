@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" The snapshot module
+
+a snapshot file is a JSON header line followed by one JSON object per
+line:
+    {"version": 1, "count": <number of objects>, "sha256": <payload hash>}
+    {"id": ..., ...}
+    ...
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Iterable
+
+
+SNAPSHOT_VERSION = 1
+
+
+def write_atomic(file_path: str, data: bytes):
+    """
+    writes data to a temporary file next to file_path, fsyncs it and
+    renames it over file_path, so readers see the old or the new file
+    but never a partial one
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp",
+                                    prefix=os.path.basename(file_path))
+    try:
+        mode = 0o644
+        if os.path.exists(file_path):
+            mode = os.stat(file_path).st_mode & 0o777
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write_snapshot(file_path: str, objs_json: Iterable[dict]):
+    """ Writes the serialized objects as a snapshot file
+    """
+    lines = [json.dumps(obj_json) + "\n" for obj_json in objs_json]
+    payload = "".join(lines).encode('utf-8')
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "count": len(lines),
+        "sha256": hashlib.sha256(payload).hexdigest()
+    }
+    write_atomic(file_path, json.dumps(header).encode('utf-8') + b"\n" +
+                 payload)
+
+
+class SnapshotReader():
+    """ Streams the objects of a snapshot file and reads them back by offset
+
+    the file stays open, so the objects can still be read after a newer
+    snapshot has been renamed over it
+    """
+
+    def __init__(self, file_path: str):
+        """ Constructor of the SnapshotReader class
+        """
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        """
+        yields (offset, serialized object) for each object of the file,
+        one line at a time; the offset is None for a file written before
+        snapshots had a header, which is parsed as a whole
+        raises ValueError once the end of a torn or corrupted file is
+        reached, so the objects already yielded must then be discarded
+        """
+        f = self._file
+        f.seek(0)
+        first_line = f.readline()
+        try:
+            header = json.loads(first_line)
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or "sha256" not in header:
+            f.seek(0)
+            try:
+                objs_json = json.load(f).values()
+            except (ValueError, AttributeError):
+                raise ValueError("{} is corrupted".format(self.file_path))
+            for obj_json in objs_json:
+                yield None, obj_json
+            return
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("{}: unsupported snapshot version {}".format(
+                self.file_path, header.get("version")))
+        checksum = hashlib.sha256()
+        count = 0
+        offset = len(first_line)
+        for line in f:
+            checksum.update(line)
+            try:
+                obj_json = json.loads(line)
+            except ValueError:
+                break
+            yield offset, obj_json
+            offset += len(line)
+            count += 1
+        checksum.update(f.read())
+        if checksum.hexdigest() != header["sha256"] or \
+                count != header.get("count"):
+            raise ValueError("{} is torn or corrupted".format(
+                self.file_path))
+
+    def read(self, offset: int) -> dict:
+        """ Returns the serialized object stored at offset
+        """
+        with self._lock:
+            self._file.seek(offset)
+            return json.loads(self._file.readline())
+
+    def close(self):
+        """ Closes the file
+        """
+        self._file.close()
@@ -33,9 +33,9 @@ class SessionDBAuth(SessionExpAuth):
         returns:
             user ID
         """
-        user_id = UserSession.search({"session_id": session_id})
-        if user_id:
-            return user_id
+        user_session = UserSession.first({"session_id": session_id})
+        if user_session:
+            return user_session.user_id
         return None
 
     def destroy_session(self, request=None):
@@ -49,8 +49,8 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if not session_id:
             return False
-        user_session = UserSession.search({"session_id": session_id})
+        user_session = UserSession.first({"session_id": session_id})
         if user_session:
-            user_session[0].remove()
+            user_session.remove()
             return True
         return False
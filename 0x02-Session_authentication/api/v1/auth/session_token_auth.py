@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""the module for the signed session tokens"""
+import hashlib
+import heapq
+import hmac
+import os
+import secrets
+import threading
+import time
+
+from .session_exp_auth import SessionExpAuth
+from models.revoked_token import RevokedToken
+
+DEFAULT_SESSION_DURATION = 3600
+
+
+class SessionTokenAuth(SessionExpAuth):
+    """
+    SessionTokenAuth class
+    the session ID is a token carrying the user ID and the expiry time,
+    signed with HMAC-SHA256: user_id.expires.nonce.signature
+    a token is validated without any session store, in a time independent
+    of the number of sessions; a logout saves the nonce of the token as a
+    RevokedToken until the token expires, so with STORAGE_TYPE=sqlite the
+    revocation survives restarts and reaches every process
+    tokens always expire: after SESSION_DURATION seconds, or
+    DEFAULT_SESSION_DURATION when it's unset
+    the key is SESSION_SECRET, or a random one when unset, in which case
+    the tokens are only valid in the process that issued them
+    """
+    def __init__(self):
+        """
+        initializes the SessionTokenAuth class
+        """
+        super().__init__()
+        if self.session_duration <= 0:
+            self.session_duration = DEFAULT_SESSION_DURATION
+        secret = os.getenv('SESSION_SECRET')
+        self.secret = secret.encode() if secret else secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        RevokedToken.load_from_file()
+        self._expiries = [(revoked.expires, revoked.nonce)
+                          for revoked in RevokedToken.all()]
+        heapq.heapify(self._expiries)
+
+    def _signature(self, payload: str) -> str:
+        """
+        returns the signature of a token payload
+        """
+        return hmac.new(self.secret, payload.encode(),
+                        hashlib.sha256).hexdigest()
+
+    def _verify(self, session_id: str) -> tuple:
+        """
+        returns the user ID, the expiry time and the nonce of a token, or
+        None when it's malformed, forged, expired or revoked
+        """
+        if session_id is None or not isinstance(session_id, str) or \
+                not session_id.isascii():
+            return None
+        payload, _, signature = session_id.rpartition('.')
+        if not hmac.compare_digest(self._signature(payload), signature):
+            return None
+        try:
+            user_id, expires, nonce = payload.split('.')
+            expires = int(expires)
+        except ValueError:
+            return None
+        if expires < time.time():
+            return None
+        if RevokedToken.exists({'nonce': nonce}):
+            return None
+        return user_id, expires, nonce
+
+    def _prune(self):
+        """
+        removes the revocations of the tokens expired, from the earliest
+        one, so each revocation is removed once
+        """
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._expiries and self._expiries[0][0] < now:
+                expired.append(heapq.heappop(self._expiries)[1])
+        for nonce in expired:
+            for revoked in RevokedToken.search({'nonce': nonce}):
+                revoked.remove()
+
+    def create_session(self, user_id=None):
+        """
+        makes a signed token
+        arguments:
+            user_id (str): user id
+        returns:
+            the token
+        """
+        if user_id is None or not isinstance(user_id, str) or '.' in user_id:
+            return None
+        expires = int(time.time()) + self.session_duration
+        payload = "{}.{}.{}".format(user_id, expires, secrets.token_hex(8))
+        return "{}.{}".format(payload, self._signature(payload))
+
+    def user_id_for_session_id(self, session_id=None):
+        """
+        returns the ID of a user based on a token
+        arguments:
+            session_id (str): the token
+        returns:
+            user ID
+        """
+        token = self._verify(session_id)
+        if token is None:
+            return None
+        return token[0]
+
+    def destroy_session(self, request=None):
+        """
+        revokes the token of the request / logout
+        arguments:
+            request : request object
+        """
+        if request is None:
+            return False
+        token = self._verify(self.session_cookie(request))
+        if token is None:
+            return False
+        user_id, expires, nonce = token
+        RevokedToken(nonce=nonce, expires=expires).save()
+        with self._lock:
+            heapq.heappush(self._expiries, (expires, nonce))
+        self._prune()
+        return True
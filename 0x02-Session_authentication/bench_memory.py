@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of the model objects
+
+compares the memory used by UserSession objects, which keep their
+attributes in __slots__, with the same objects keeping them in a __dict__
+usage: ./bench_memory.py [number of sessions]
+"""
+import sys
+import tracemalloc
+import uuid
+
+from models.user_session import UserSession
+
+
+class DictUserSession():
+    """UserSession keeping its attributes in a __dict__, as before slots"""
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """Constructor of the DictUserSession class"""
+        self.id = kwargs.get('id')
+        self.created_at = kwargs.get('created_at')
+        self.updated_at = kwargs.get('updated_at')
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def measure(cls, count: int) -> int:
+    """returns the bytes allocated by count objects of cls"""
+    kwargs = [{
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "session_id": str(uuid.uuid4()),
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00"
+    } for i in range(count)]
+    tracemalloc.start()
+    objs = [cls(**kw) for kw in kwargs]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return used
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    slots = measure(UserSession, count)
+    dicts = measure(DictUserSession, count)
+    print("{} sessions".format(count))
+    print("__dict__: {:.1f} MiB, {} bytes per session".format(
+        dicts / 2 ** 20, dicts // count))
+    print("__slots__: {:.1f} MiB, {} bytes per session".format(
+        slots / 2 ** 20, slots // count))
+    print("per million sessions: {:.1f} MiB saved".format(
+        (dicts - slots) / count * 10 ** 6 / 2 ** 20))
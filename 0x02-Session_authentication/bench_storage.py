@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark of the model engines
+
+runs the same saves, gets and searches of User objects on every storage
+engine of models/engine, each in a new temporary directory
+usage: ./bench_storage.py [number of users]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import models.base
+from models.engine.file_engine import FileEngine
+from models.engine.journal_engine import JournalEngine
+from models.engine.memory_engine import MemoryEngine
+from models.engine.sqlite_engine import SQLiteEngine
+from models.user import User
+
+ENGINES = [
+    ("memory", MemoryEngine),
+    ("file", FileEngine),
+    ("journal", JournalEngine),
+    ("sqlite", SQLiteEngine),
+]
+
+
+def rate(count: int, start: float) -> str:
+    """returns the operations per second since start"""
+    return "{:>10.0f} ops/s".format(count / (time.perf_counter() - start))
+
+
+def run(engine_class, count: int) -> list:
+    """returns the save, get and search rates of an engine"""
+    models.base.storage = engine_class()
+    User.load_from_file()
+    users = [User(email="user{}@mail.com".format(i)) for i in range(count)]
+
+    start = time.perf_counter()
+    for user in users:
+        user.save()
+    User.flush()
+    saves = rate(count, start)
+
+    start = time.perf_counter()
+    for user in users:
+        User.get(user.id)
+    gets = rate(count, start)
+
+    start = time.perf_counter()
+    for user in users:
+        User.search({'email': user.email})
+    searches = rate(count, start)
+    return [saves, gets, searches]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    cwd = os.getcwd()
+    print("{} users".format(count))
+    print("{:<8} {:>16} {:>16} {:>16}".format(
+        "engine", "save", "get", "search"))
+    for name, engine_class in ENGINES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                print("{:<8} {} {} {}".format(
+                    name, *run(engine_class, count)))
+            finally:
+                os.chdir(cwd)
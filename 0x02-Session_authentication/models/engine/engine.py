@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""the storage engine module"""
+from abc import ABC, abstractmethod
+from typing import List, TypeVar
+
+
+class Engine(ABC):
+    """Storage engine of the models
+
+    Base forwards the storage of every model class to one engine, chosen
+    with STORAGE_TYPE in models/base.py; each method takes the model class
+    or the object it works on
+    """
+
+    @abstractmethod
+    def load(self, cls):
+        """loads the objects of the class from the disk"""
+        pass
+
+    @abstractmethod
+    def save_to_file(self, cls):
+        """writes all the objects of the class to the disk"""
+        pass
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')):
+        """stores the object"""
+        pass
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')):
+        """removes the object"""
+        pass
+
+    @abstractmethod
+    def count(self, cls) -> int:
+        """returns the number of objects of the class"""
+        pass
+
+    @abstractmethod
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """returns the object of the class with the given id"""
+        pass
+
+    @abstractmethod
+    def search(self, cls, attributes: dict = {},
+               limit: int = None) -> List[TypeVar('Base')]:
+        """
+        returns the objects of the class matching the attributes, at most
+        limit of them
+        """
+        pass
+
+    def flush(self):
+        """writes every pending mutation to the disk"""
+        pass
+
+    def compact(self, cls):
+        """compacts the storage of the class"""
+        pass
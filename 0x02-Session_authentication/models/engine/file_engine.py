@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""the file engine module"""
+import os
+import threading
+from typing import TypeVar
+
+from models.engine.journal import Journal
+from models.engine.memory_engine import MemoryEngine
+from models.engine.snapshot import SnapshotReader, write_snapshot
+from models.engine.write_behind import WriteBehindFlusher
+
+
+def _env(name: str, default, cast=int):
+    """reads a number from the environment"""
+    try:
+        return cast(os.getenv(name))
+    except Exception:
+        return default
+
+
+def _env_flag(name: str) -> bool:
+    """reads a boolean from the environment"""
+    return os.getenv(name) in ("1", "true", "True")
+
+
+class FileEngine(MemoryEngine):
+    """Storage engine keeping the objects in memory and in one JSON file
+    per class, .db_<Class>.json, rewritten on every mutation
+
+    with STORAGE_LAZY_LOAD set, a load only keeps the offset and the
+    indexed attributes of each object, and the object is built on first
+    access; with STORAGE_WRITE_BEHIND set, the files are written by a
+    background WriteBehindFlusher
+    """
+    COMPACT_ON_LOAD = True
+
+    def __init__(self):
+        """Constructor of the FileEngine class"""
+        super().__init__()
+        self.pending = {}
+        self.lazy_load = _env_flag("STORAGE_LAZY_LOAD")
+        self.readers = {}
+        self.journals = {}
+        self.versions = {}
+        self.written = {}
+        self._file_locks = {}
+        self.write_behind = None
+        if _env_flag("STORAGE_WRITE_BEHIND"):
+            self.write_behind = WriteBehindFlusher(
+                self.save_to_file,
+                _env("WRITE_BEHIND_MAX_DELAY", 0.5, float),
+                _env("WRITE_BEHIND_BATCH_SIZE", 100))
+
+    @staticmethod
+    def _file_path(cls) -> str:
+        """returns the path of the file of the class"""
+        return ".db_{}.json".format(cls.__name__)
+
+    def _file_lock(self, cls) -> threading.Lock:
+        """returns the lock serializing the file writes of the class"""
+        return self._class_lock(self._file_locks, cls, threading.Lock)
+
+    def journal(self, cls) -> Journal:
+        """returns the journal of the class"""
+        s_class = cls.__name__
+        if self.journals.get(s_class) is None:
+            file_path = ".db_{}.journal".format(s_class)
+            self.journals[s_class] = Journal(
+                file_path, _env("JOURNAL_FSYNC_EVERY", 100))
+        return self.journals[s_class]
+
+    def load(self, cls):
+        """
+        loads the objects of the class from its file, one object at a
+        time, then replays the journal left by the journal engine
+        """
+        s_class = cls.__name__
+        data = {}
+        pending = {}
+        indexes = self._new_indexes(cls)
+        with self._file_lock(cls), self._lock(cls):
+            reader = self._read_files(cls, data, pending, indexes)
+            old_reader = self.readers.pop(s_class, None)
+            if reader is not None:
+                self.readers[s_class] = reader
+            self.pending[s_class] = pending
+            self.indexes[s_class] = indexes
+            self.data[s_class] = data
+            if old_reader is not None:
+                old_reader.close()
+        if self.journal(cls).records > 0 and self.COMPACT_ON_LOAD:
+            self.compact(cls)
+
+    def _read_files(self, cls, data: dict, pending: dict,
+                    indexes: dict) -> SnapshotReader:
+        """
+        reads the file and the journal of the class into data, pending
+        and indexes
+        returns the reader of the file if objects are still pending
+        """
+        file_path = self._file_path(cls)
+        reader = None
+        if os.path.exists(file_path):
+            reader = SnapshotReader(file_path)
+            for offset, obj_json in reader:
+                if self.lazy_load and offset is not None:
+                    pending[obj_json['id']] = offset
+                    self._index_values(cls, obj_json['id'], obj_json,
+                                       indexes)
+                else:
+                    obj = cls(**obj_json)
+                    data[obj.id] = obj
+            if len(pending) == 0:
+                reader.close()
+                reader = None
+
+        for record in self.journal(cls).replay():
+            if record.get('op') == 'save':
+                obj = cls(**record['obj'])
+                data[obj.id] = obj
+                pending.pop(obj.id, None)
+            elif record.get('op') == 'remove':
+                data.pop(record['id'], None)
+                if pending.pop(record['id'], None) is not None:
+                    self._unindex_id(cls, record['id'], indexes)
+        for obj in data.values():
+            self._index(obj, indexes)
+        return reader
+
+    def _read_pending(self, cls, offset: int) -> dict:
+        """returns the serialized object of the class at offset"""
+        return self.readers[cls.__name__].read(offset)
+
+    def _build(self, cls, obj_id: str) -> TypeVar('Base'):
+        """builds an object not built yet by a lazy load"""
+        s_class = cls.__name__
+        with self._lock(cls):
+            offset = self.pending[s_class].get(obj_id)
+            if offset is None:
+                return self._objects(cls).get(obj_id)
+            obj = cls(**self._read_pending(cls, offset))
+            self._objects(cls)[obj_id] = obj
+            del self.pending[s_class][obj_id]
+        return obj
+
+    def _store(self, obj: TypeVar('Base')):
+        """adds the object to its class, in place of its copy not built"""
+        self.pending.get(obj.__class__.__name__, {}).pop(obj.id, None)
+        super()._store(obj)
+
+    def count(self, cls) -> int:
+        """returns the number of objects of the class, built or not"""
+        return super().count(cls) + len(self.pending.get(cls.__name__, {}))
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """returns the object of the class with the given id"""
+        obj = super().get(cls, obj_id)
+        if obj is None and obj_id in self.pending.get(cls.__name__, {}):
+            obj = self._build(cls, obj_id)
+        return obj
+
+    def _candidates(self, cls, obj_ids):
+        """
+        yields the objects of the class with the given ids, or all,
+        building those not built yet
+        """
+        pending = list(self.pending.get(cls.__name__, {}))
+        if obj_ids is not None or len(pending) == 0:
+            yield from super()._candidates(cls, obj_ids)
+            return
+        objs = list(self._objects(cls).values())
+        yield from objs
+        built = {obj.id for obj in objs}
+        for obj_id in pending:
+            obj = self._build(cls, obj_id)
+            if obj is not None and obj_id not in built:
+                yield obj
+
+    def save_to_file(self, cls):
+        """writes all the objects of the class to its file, atomically"""
+        self._write_snapshot(cls)
+
+    def _write_snapshot(self, cls, rotate_journal: bool = False,
+                        version: int = None):
+        """
+        writes the objects of the class to its file, unless the file
+        already holds the mutations up to version
+        the file lock is taken first, so snapshots are written one at a
+        time in the order they're taken; the objects are listed under the
+        class lock, but serialized and written after it's released, so
+        the mutations of the class don't wait for the disk, and the
+        writers waiting for the file lock meanwhile find their mutations
+        in the next snapshot and skip their own
+        """
+        s_class = cls.__name__
+        with self._file_lock(cls):
+            with self._lock(cls):
+                if version is not None and \
+                        self.written.get(s_class, 0) >= version:
+                    return
+                if rotate_journal:
+                    self.journal(cls).rotate()
+                snapshot_version = self.versions.get(s_class, 0)
+                objs = list(self._objects(cls).values())
+                reader = self.readers.get(s_class)
+                offsets = list(self.pending.get(s_class, {}).values())
+            objs_json = [obj.to_json(True) for obj in objs]
+            for offset in offsets:
+                objs_json.append(reader.read(offset))
+            write_snapshot(self._file_path(cls), objs_json)
+            self.written[s_class] = snapshot_version
+            if rotate_journal:
+                self.journal(cls).discard_rotated()
+
+    def _persist(self, cls, record: dict):
+        """
+        counts one mutation of the class, under the class lock, and
+        queues the class for the write-behind flusher if there's one
+        """
+        s_class = cls.__name__
+        self.versions[s_class] = self.versions.get(s_class, 0) + 1
+        if self.write_behind is not None:
+            self.write_behind.mark_dirty(cls)
+
+    def _write(self, cls):
+        """
+        writes the whole class to its file after a mutation, once the
+        class lock is released, unless the write-behind flusher does
+        """
+        if self.write_behind is None:
+            self._write_snapshot(cls, version=self.versions[cls.__name__])
+
+    def flush(self):
+        """writes every pending mutation to the disk"""
+        if self.write_behind is not None:
+            self.write_behind.flush()
+        for journal in list(self.journals.values()):
+            journal.sync()
+
+    def compact(self, cls):
+        """writes a snapshot of the class and empties its journal
+
+        the journal is rotated when the snapshot is taken, so the
+        mutations made while the snapshot is written go to a new journal
+        """
+        try:
+            self._write_snapshot(cls, rotate_journal=True)
+        finally:
+            self.journal(cls).compacting = False
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""the journal module"""
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+
+
+class Journal():
+    """Append-only journal of the mutations of one model class
+
+    every record is written and flushed to the OS right away, so a crash
+    of the process does not lose it; the fsync to the disk is batched
+    every `fsync_every` records or `fsync_interval` seconds
+    """
+
+    def __init__(self, file_path: str, fsync_every: int = 100,
+                 fsync_interval: float = 1.0):
+        """Constructor of the Journal class"""
+        self.file_path = file_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.records = 0
+        self.compacting = False
+        self.lock = threading.RLock()
+        self._pending = 0
+        self._file = None
+        self._syncer = None
+        atexit.register(self.sync)
+
+    def append(self, record: dict):
+        """appends one record to the journal"""
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            if self._file is None:
+                self._file = open(self.file_path, 'a')
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self.sync()
+            elif self._syncer is None and self.fsync_interval > 0:
+                self._syncer = threading.Thread(target=self._sync_loop,
+                                                daemon=True)
+                self._syncer.start()
+
+    def sync(self):
+        """fsyncs the records appended since the last sync"""
+        with self.lock:
+            if self._file is not None and self._pending > 0:
+                os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def _sync_loop(self):
+        """syncs the journal every fsync_interval seconds"""
+        while True:
+            time.sleep(self.fsync_interval)
+            self.sync()
+
+    def replay(self):
+        """yields the records of the journal in order, those of a journal
+        rotated by an unfinished compaction first
+
+        a torn last line, left by a crash in the middle of an append,
+        is dropped and cut from the file
+        """
+        self.records = 0
+        for file_path in (self.file_path + ".old", self.file_path):
+            if not os.path.exists(file_path):
+                continue
+            valid_size = 0
+            with open(file_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_size += len(line)
+                    self.records += 1
+                    yield record
+            if os.path.getsize(file_path) > valid_size:
+                with open(file_path, 'r+b') as f:
+                    f.truncate(valid_size)
+
+    def rotate(self):
+        """
+        moves the records aside to <journal>.old before they are written
+        in a snapshot; the next records go to a new journal
+        """
+        with self.lock:
+            self.sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            old_path = self.file_path + ".old"
+            exists = os.path.exists(self.file_path)
+            if exists and os.path.exists(old_path):
+                with open(old_path, 'ab') as old, \
+                        open(self.file_path, 'rb') as f:
+                    shutil.copyfileobj(f, old)
+                    old.flush()
+                    os.fsync(old.fileno())
+                os.remove(self.file_path)
+            elif exists:
+                os.replace(self.file_path, old_path)
+            self.records = 0
+            self._pending = 0
+
+    def discard_rotated(self):
+        """removes the rotated records once they are in a snapshot"""
+        old_path = self.file_path + ".old"
+        if os.path.exists(old_path):
+            os.remove(old_path)
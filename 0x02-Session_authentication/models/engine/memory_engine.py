@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""the memory engine module"""
+import threading
+from typing import List, TypeVar
+
+from models.engine.engine import Engine
+
+
+class MemoryEngine(Engine):
+    """Storage engine keeping the objects in dicts of the process
+
+    nothing is written to the disk; equalities on the attributes listed in
+    INDEXED_ATTRIBUTES are resolved through secondary hash indexes
+
+    the objects of a class are mutated under the lock of the class, while
+    get, search and count never lock: they read the dicts of the class
+    through single operations such as dict.get or list(), which are
+    atomic under the GIL, and a load swaps in new dicts instead of
+    emptying the current ones
+    """
+
+    def __init__(self):
+        """Constructor of the MemoryEngine class"""
+        self.data = {}
+        self.indexes = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _class_lock(self, locks: dict, cls, factory=threading.RLock):
+        """returns the lock of a class in locks, creating it"""
+        lock = locks.get(cls.__name__)
+        if lock is None:
+            with self._locks_lock:
+                lock = locks.setdefault(cls.__name__, factory())
+        return lock
+
+    def _lock(self, cls) -> threading.RLock:
+        """returns the lock of the class"""
+        return self._class_lock(self._locks, cls)
+
+    def _objects(self, cls) -> dict:
+        """returns the objects of the class by id"""
+        return self.data.setdefault(cls.__name__, {})
+
+    def load(self, cls):
+        """nothing to load"""
+        self._objects(cls)
+
+    def save_to_file(self, cls):
+        """nothing to write"""
+        pass
+
+    def _persist(self, cls, record: dict):
+        """persists one mutation of the class, under the class lock"""
+        pass
+
+    def _write(self, cls):
+        """writes the mutations of the class, once its lock is released"""
+        pass
+
+    def _store(self, obj: TypeVar('Base')):
+        """adds the object to its class, under the class lock"""
+        self._objects(obj.__class__)[obj.id] = obj
+        self._index(obj)
+
+    def save(self, obj: TypeVar('Base')):
+        """stores the object"""
+        cls = obj.__class__
+        with self._lock(cls):
+            self._store(obj)
+            self._persist(cls, {'op': 'save', 'obj': obj.to_json(True)})
+        self._write(cls)
+
+    def remove(self, obj: TypeVar('Base')):
+        """removes the object"""
+        cls = obj.__class__
+        with self._lock(cls):
+            objects = self._objects(cls)
+            if objects.get(obj.id) is None:
+                return
+            del objects[obj.id]
+            self._unindex_id(cls, obj.id)
+            self._persist(cls, {'op': 'remove', 'id': obj.id})
+        self._write(cls)
+
+    def _new_indexes(self, cls) -> dict:
+        """returns empty secondary indexes for the class"""
+        return {attr: {'values': {}, 'ids': {}}
+                for attr in cls.INDEXED_ATTRIBUTES}
+
+    def _indexes(self, cls) -> dict:
+        """returns the secondary indexes of the class, creating them"""
+        indexes = self.indexes.get(cls.__name__)
+        if indexes is None:
+            with self._lock(cls):
+                indexes = self.indexes.setdefault(cls.__name__,
+                                                  self._new_indexes(cls))
+        return indexes
+
+    def _index_values(self, cls, obj_id: str, values: dict,
+                      indexes: dict = None):
+        """
+        adds an object to the secondary indexes of the class
+        a bucket is copied, not modified, so readers can iterate it
+        """
+        if indexes is None:
+            indexes = self._indexes(cls)
+        for attr, index in indexes.items():
+            value = values.get(attr)
+            if obj_id in index['ids']:
+                if index['ids'][obj_id] == value:
+                    continue
+                self._unindex_attribute(obj_id, index)
+            try:
+                bucket = dict(index['values'].get(value, {}))
+            except TypeError:
+                continue
+            bucket[obj_id] = None
+            index['values'][value] = bucket
+            index['ids'][obj_id] = value
+
+    def _unindex_id(self, cls, obj_id: str, indexes: dict = None):
+        """removes an object from the secondary indexes of the class"""
+        if indexes is None:
+            indexes = self._indexes(cls)
+        for index in indexes.values():
+            self._unindex_attribute(obj_id, index)
+
+    @staticmethod
+    def _unindex_attribute(obj_id: str, index: dict):
+        """removes an object from one secondary index"""
+        if obj_id not in index['ids']:
+            return
+        value = index['ids'].pop(obj_id)
+        bucket = dict(index['values'].get(value, {}))
+        bucket.pop(obj_id, None)
+        if len(bucket) == 0:
+            index['values'].pop(value, None)
+        else:
+            index['values'][value] = bucket
+
+    def _index(self, obj: TypeVar('Base'), indexes: dict = None):
+        """adds the object to the secondary indexes of its class"""
+        values = {attr: getattr(obj, attr, None)
+                  for attr in obj.INDEXED_ATTRIBUTES}
+        self._index_values(obj.__class__, obj.id, values, indexes)
+
+    def count(self, cls) -> int:
+        """returns the number of objects of the class"""
+        return len(self._objects(cls))
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """returns the object of the class with the given id"""
+        return self._objects(cls).get(obj_id)
+
+    def _plan(self, cls, attributes: dict) -> tuple:
+        """
+        returns the candidate ids of a search and the attributes to check
+        on them, in order
+        the equality with the smallest index bucket gives the candidates;
+        the indexed attributes are checked from the most to the least
+        selective, so most candidates are rejected by the first check, and
+        the attributes without an index come last
+        the candidate ids are None when the whole class must be scanned
+        """
+        indexes = self._indexes(cls)
+        indexed = []
+        others = []
+        for k, v in attributes.items():
+            if k in indexes:
+                try:
+                    indexed.append((indexes[k]['values'].get(v, {}), k, v))
+                    continue
+                except TypeError:
+                    pass
+            others.append((k, v))
+        indexed.sort(key=lambda item: len(item[0]))
+        checks = [(k, v) for bucket, k, v in indexed] + others
+        if len(indexed) == 0:
+            return None, checks
+        return indexed[0][0], checks
+
+    def _candidates(self, cls, obj_ids):
+        """yields the objects of the class with the given ids, or all"""
+        if obj_ids is not None:
+            for obj_id in list(obj_ids):
+                obj = self.get(cls, obj_id)
+                if obj is not None:
+                    yield obj
+            return
+        yield from list(self._objects(cls).values())
+
+    def search(self, cls, attributes: dict = {},
+               limit: int = None) -> List[TypeVar('Base')]:
+        """
+        returns the objects of the class matching the attributes, at most
+        limit of them
+        the candidates come from the most selective secondary index, see
+        _plan, and the search stops as soon as limit objects match
+        """
+        obj_ids, checks = self._plan(cls, attributes)
+        result = []
+        if limit is not None and limit <= 0:
+            return result
+        for obj in self._candidates(cls, obj_ids):
+            if not all(getattr(obj, k) == v for k, v in checks):
+                continue
+            result.append(obj)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""the SQLite engine module"""
+import json
+import os
+import sqlite3
+import threading
+from typing import List
+
+from models.engine.engine import Engine
+from models.engine.snapshot import SnapshotReader, write_snapshot
+
+
+class SQLiteEngine(Engine):
+    """Storage engine shared by the processes of a host through the SQLite
+    database STORAGE_SQLITE_PATH (default .db.sqlite)
+
+    each class gets a table holding the serialized objects, with one
+    indexed column per attribute of INDEXED_ATTRIBUTES; the objects
+    already built are cached per process, and the cache is dropped
+    whenever another connection has written to the database, which
+    SQLite reports through PRAGMA data_version
+    """
+
+    def __init__(self):
+        """Constructor of the SQLiteEngine class"""
+        self.file_path = os.getenv("STORAGE_SQLITE_PATH", ".db.sqlite")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables = set()
+        self._cache = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """returns the connection of the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.data_version = None
+        return conn
+
+    def _table(self, cls) -> str:
+        """returns the quoted table name of the class, creating it"""
+        s_class = cls.__name__
+        table = '"{}"'.format(s_class)
+        if s_class in self._tables:
+            return table
+        with self._lock:
+            conn = self._connection()
+            columns = ", ".join('"{}"'.format(attr)
+                                for attr in cls.INDEXED_ATTRIBUTES)
+            conn.execute("CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, "
+                         "data TEXT NOT NULL{})".format(
+                             table, ", " + columns if columns else ""))
+            existing = [row[1] for row in
+                        conn.execute("PRAGMA table_info({})".format(table))]
+            for attr in cls.INDEXED_ATTRIBUTES:
+                if attr not in existing:
+                    conn.execute('ALTER TABLE {} ADD COLUMN "{}"'.format(
+                        table, attr))
+                    conn.execute('UPDATE {} SET "{}" = json_extract(data, ?)'
+                                 .format(table, attr), ("$." + attr,))
+                conn.execute('CREATE INDEX IF NOT EXISTS "{}_{}" ON {} ("{}")'
+                             .format(s_class, attr, table, attr))
+            self._tables.add(s_class)
+        return table
+
+    def _objects(self, cls) -> dict:
+        """
+        returns the cache of the objects of the class, emptied if another
+        connection wrote to the database since the last read of this one
+        """
+        conn = self._connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._local.data_version:
+            self._local.data_version = version
+            self._cache = {}
+        return self._cache.setdefault(cls.__name__, {})
+
+    def _build(self, cls, objects: dict, obj_id: str, data: str):
+        """returns the cached object or builds it from its data"""
+        obj = objects.get(obj_id)
+        if obj is None:
+            obj = cls(**json.loads(data))
+            objects[obj_id] = obj
+        return obj
+
+    def get(self, cls, obj_id: str):
+        """returns the object of the class with the given id"""
+        table = self._table(cls)
+        objects = self._objects(cls)
+        if obj_id in objects:
+            return objects[obj_id]
+        row = self._connection().execute(
+            "SELECT data FROM {} WHERE id = ?".format(table),
+            (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return self._build(cls, objects, obj_id, row[0])
+
+    def search(self, cls, attributes: dict = {},
+               limit: int = None) -> List:
+        """
+        returns the objects of the class matching the attributes, at most
+        limit of them
+        the indexed attributes are matched by SQLite, which picks the most
+        selective index, the others on the objects it returns; rows are
+        read until limit objects match
+        """
+        table = self._table(cls)
+        objects = self._objects(cls)
+        where = []
+        params = []
+        others = {}
+        for k, v in attributes.items():
+            if k in cls.INDEXED_ATTRIBUTES and \
+                    isinstance(v, (str, int, float, type(None))):
+                where.append('"{}" IS ?'.format(k))
+                params.append(v)
+            else:
+                others[k] = v
+        query = "SELECT id, data FROM {}".format(table)
+        if len(where) > 0:
+            query += " WHERE " + " AND ".join(where)
+        result = []
+        if limit is not None and limit <= 0:
+            return result
+        if limit is not None and len(others) == 0:
+            query += " LIMIT {:d}".format(limit)
+        for obj_id, data in self._connection().execute(query, params):
+            obj = self._build(cls, objects, obj_id, data)
+            if all(getattr(obj, k) == v for k, v in others.items()):
+                result.append(obj)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def count(self, cls) -> int:
+        """returns the number of objects of the class"""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM {}".format(self._table(cls))).fetchone()[0]
+
+    def save(self, obj):
+        """inserts or replaces the object"""
+        cls = obj.__class__
+        table = self._table(cls)
+        columns = ["id", "data"] + ['"{}"'.format(attr)
+                                    for attr in cls.INDEXED_ATTRIBUTES]
+        values = [obj.id, json.dumps(obj.to_json(True))]
+        values += [getattr(obj, attr, None)
+                   for attr in cls.INDEXED_ATTRIBUTES]
+        self._connection().execute(
+            "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                table, ", ".join(columns), ", ".join("?" * len(columns))),
+            values)
+        self._objects(cls)[obj.id] = obj
+
+    def remove(self, obj) -> bool:
+        """deletes the object, returns False if it didn't exist"""
+        cls = obj.__class__
+        cursor = self._connection().execute(
+            "DELETE FROM {} WHERE id = ?".format(self._table(cls)),
+            (obj.id,))
+        self._objects(cls).pop(obj.id, None)
+        return cursor.rowcount > 0
+
+    def load(self, cls):
+        """
+        nothing is loaded: .db_<Class>.json is only imported into the
+        table of the class if it's empty; concurrent imports insert each
+        object once
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        if self.count(cls) > 0 or not os.path.exists(file_path):
+            return
+        reader = SnapshotReader(file_path)
+        try:
+            objs_json = [obj_json for offset, obj_json in reader]
+        finally:
+            reader.close()
+        table = self._table(cls)
+        columns = ["id", "data"] + ['"{}"'.format(attr)
+                                    for attr in cls.INDEXED_ATTRIBUTES]
+        rows = ([obj_json.get('id'), json.dumps(obj_json)] +
+                [obj_json.get(attr) for attr in cls.INDEXED_ATTRIBUTES]
+                for obj_json in objs_json)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(
+                    table, ", ".join(columns), ", ".join("?" * len(columns))),
+                rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save_to_file(self, cls):
+        """exports the table of the class to .db_<Class>.json"""
+        objs_json = [json.loads(data) for (data,) in
+                     self._connection().execute("SELECT data FROM {}".format(
+                         self._table(cls)))]
+        write_snapshot(".db_{}.json".format(cls.__name__), objs_json)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""the write-behind module"""
+import atexit
+import threading
+import time
+
+
+class WriteBehindFlusher():
+    """Writes the files of the dirty model classes from a background thread
+
+    a class is written by calling write(cls); the mutations of a class
+    are coalesced: a class is written once per flush however many times
+    it was saved, at the latest `max_delay` seconds after its first
+    mutation or as soon as `batch_size` mutations are pending
+    """
+
+    def __init__(self, write, max_delay: float = 0.5,
+                 batch_size: int = 100):
+        """Constructor of the WriteBehindFlusher class"""
+        self.write = write
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        self._dirty = {}
+        self._mutations = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def mark_dirty(self, cls):
+        """queues the class to be written by the next flush"""
+        with self._cond:
+            if len(self._dirty) == 0:
+                self._oldest = time.monotonic()
+            self._dirty[cls.__name__] = cls
+            self._mutations += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        """waits for a full batch or the max delay, then flushes"""
+        while True:
+            with self._cond:
+                while len(self._dirty) == 0:
+                    self._cond.wait()
+                deadline = self._oldest + self.max_delay
+                while self._mutations < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.max_delay)
+
+    def flush(self):
+        """writes every dirty class now, a failed class stays queued"""
+        with self._flush_lock:
+            with self._cond:
+                dirty = list(self._dirty.values())
+                self._dirty = {}
+                self._mutations = 0
+            if len(dirty) == 0:
+                return
+            start = time.perf_counter()
+            for i, cls in enumerate(dirty):
+                try:
+                    self.write(cls)
+                except Exception:
+                    self.errors += 1
+                    for failed in dirty[i:]:
+                        self.mark_dirty(failed)
+                    raise
+            latency = time.perf_counter() - start
+            self.flushes += 1
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+
+    def stats(self) -> dict:
+        """returns the queue depth and flush latency metrics"""
+        with self._cond:
+            queue_depth = len(self._dirty)
+            pending_mutations = self._mutations
+        avg = 0.0
+        if self.flushes > 0:
+            avg = self.total_flush_latency / self.flushes
+        return {
+            "queue_depth": queue_depth,
+            "pending_mutations": pending_mutations,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "last_flush_latency": self.last_flush_latency,
+            "avg_flush_latency": avg,
+            "max_flush_latency": self.max_flush_latency
+        }
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""The RevokedToken module"""
+from models.base import Base
+
+
+class RevokedToken(Base):
+    """The RevokedToken class, a session token destroyed by a logout"""
+    __slots__ = ('nonce', 'expires')
+    INDEXED_ATTRIBUTES = ('nonce',)
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """constructor of the RevokedToken class"""
+        super().__init__(*args, **kwargs)
+        self.nonce = kwargs.get('nonce')
+        self.expires = kwargs.get('expires')
@@ -6,6 +6,8 @@ from models.base import Base
 
 class User(Base):
     """The User classes"""
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    INDEXED_ATTRIBUTES = ('email',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """Constructor of the User class"""
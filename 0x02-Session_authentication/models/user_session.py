@@ -5,6 +5,8 @@ from models.base import Base
 
 class UserSession(Base):
     """The UserSession class"""
+    __slots__ = ('user_id', 'session_id')
+    INDEXED_ATTRIBUTES = ('session_id',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """constructor of the UserSession class"""
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""tests of the signed session tokens"""
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import models.base
+from api.v1.auth.session_token_auth import (
+    DEFAULT_SESSION_DURATION,
+    SessionTokenAuth
+)
+from models.engine.memory_engine import MemoryEngine
+from models.engine.sqlite_engine import SQLiteEngine
+from models.revoked_token import RevokedToken
+
+ENV = {"SESSION_NAME": "_my_session_id", "SESSION_SECRET": "secret",
+       "SESSION_DURATION": "60"}
+
+
+def request_with(token: str) -> SimpleNamespace:
+    """returns a request carrying token in its session cookie"""
+    return SimpleNamespace(cookies={ENV["SESSION_NAME"]: token})
+
+
+class TestSessionTokenAuth(unittest.TestCase):
+    """tests of SessionTokenAuth"""
+
+    def setUp(self):
+        """uses a new memory storage and the test environment"""
+        patcher = mock.patch.dict(os.environ, ENV)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        storage = mock.patch.object(models.base, "storage", MemoryEngine())
+        storage.start()
+        self.addCleanup(storage.stop)
+        self.auth = SessionTokenAuth()
+
+    def test_valid(self):
+        """a token issued for a user is valid"""
+        token = self.auth.create_session("user-1")
+        self.assertEqual(self.auth.user_id_for_session_id(token), "user-1")
+
+    def test_invalid_user_id(self):
+        """no token is issued without a valid user ID"""
+        self.assertIsNone(self.auth.create_session(None))
+        self.assertIsNone(self.auth.create_session(42))
+        self.assertIsNone(self.auth.create_session("user.1"))
+
+    def test_forged(self):
+        """a token whose payload or signature changed is rejected"""
+        token = self.auth.create_session("user-1")
+        user_id, expires, nonce, signature = token.split(".")
+        forged = [
+            ".".join(["user-2", expires, nonce, signature]),
+            ".".join([user_id, str(int(expires) + 60), nonce, signature]),
+            ".".join([user_id, expires, nonce, "0" * len(signature)]),
+            token[:-1],
+            ".".join([user_id, expires, nonce, "\u00e9" * 2]),
+            "abc.123.n.\u00e9\u00e9",
+            "not a token",
+            "",
+            None,
+        ]
+        for session_id in forged:
+            self.assertIsNone(self.auth.user_id_for_session_id(session_id))
+
+    def test_other_secret(self):
+        """a token signed with another secret is rejected"""
+        token = self.auth.create_session("user-1")
+        with mock.patch.dict(os.environ, {"SESSION_SECRET": "other"}):
+            other = SessionTokenAuth()
+        self.assertIsNone(other.user_id_for_session_id(token))
+
+    def test_expired(self):
+        """a token is rejected once expired"""
+        token = self.auth.create_session("user-1")
+        with mock.patch("time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.auth.user_id_for_session_id(token))
+
+    def test_default_duration(self):
+        """tokens expire even without SESSION_DURATION"""
+        with mock.patch.dict(os.environ, {"SESSION_DURATION": ""}):
+            auth = SessionTokenAuth()
+        self.assertEqual(auth.session_duration, DEFAULT_SESSION_DURATION)
+        token = auth.create_session("user-1")
+        later = time.time() + DEFAULT_SESSION_DURATION + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertIsNone(auth.user_id_for_session_id(token))
+
+    def test_revoked(self):
+        """a token is rejected once destroyed, and only that token"""
+        token = self.auth.create_session("user-1")
+        other = self.auth.create_session("user-1")
+        self.assertTrue(self.auth.destroy_session(request_with(token)))
+        self.assertIsNone(self.auth.user_id_for_session_id(token))
+        self.assertFalse(self.auth.destroy_session(request_with(token)))
+        self.assertEqual(self.auth.user_id_for_session_id(other), "user-1")
+
+    def test_revoked_after_restart(self):
+        """a new instance still rejects a destroyed token"""
+        token = self.auth.create_session("user-1")
+        self.auth.destroy_session(request_with(token))
+        self.assertIsNone(SessionTokenAuth().user_id_for_session_id(token))
+
+    def test_prune(self):
+        """the revocations are removed once their tokens expire"""
+        token = self.auth.create_session("user-1")
+        self.auth.destroy_session(request_with(token))
+        self.assertEqual(RevokedToken.count(), 1)
+        with mock.patch("time.time", return_value=time.time() + 61):
+            other = self.auth.create_session("user-1")
+            self.auth.destroy_session(request_with(other))
+        self.assertEqual([revoked.nonce for revoked in RevokedToken.all()],
+                         [other.split(".")[2]])
+
+
+class TestSessionTokenAuthSQLite(unittest.TestCase):
+    """tests of SessionTokenAuth sharing the revocations through SQLite"""
+
+    def setUp(self):
+        """uses a SQLite database in a temporary directory"""
+        patcher = mock.patch.dict(os.environ, ENV)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "db.sqlite")
+        env = mock.patch.dict(os.environ, {"STORAGE_SQLITE_PATH": self.path})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_revoked_in_every_process(self):
+        """a token destroyed by one process is rejected by another one"""
+        first = SQLiteEngine()
+        second = SQLiteEngine()
+        with mock.patch.object(models.base, "storage", first):
+            auth = SessionTokenAuth()
+            token = auth.create_session("user-1")
+        with mock.patch.object(models.base, "storage", second):
+            other = SessionTokenAuth()
+            self.assertEqual(other.user_id_for_session_id(token), "user-1")
+        with mock.patch.object(models.base, "storage", first):
+            self.assertTrue(auth.destroy_session(request_with(token)))
+        with mock.patch.object(models.base, "storage", second):
+            self.assertIsNone(other.user_id_for_session_id(token))
+        with mock.patch.object(models.base, "storage", SQLiteEngine()):
+            restarted = SessionTokenAuth()
+            self.assertIsNone(restarted.user_id_for_session_id(token))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@
 """
 Flask application
 """
+import os
+
 from flask import (
     Flask,
     request,
@@ -11,10 +13,24 @@ from flask import (
     url_for
 )
 
-from auth import Auth
+from auth import Auth, VerificationExecutor, VerificationRejected
 
 app = Flask(__name__)
 AUTH = Auth()
+VERIFIER = VerificationExecutor(
+    int(os.getenv("VERIFY_WORKERS", 0)) or None,
+    int(os.getenv("VERIFY_QUEUE_SIZE")) if os.getenv("VERIFY_QUEUE_SIZE")
+    else None,
+    float(os.getenv("VERIFY_MAX_WAIT_MS", 1000))
+)
+
+
+@app.teardown_appcontext
+def close_session(exception) -> None:
+    """
+    Closes the database session of the request
+    """
+    AUTH.close_session()
 
 
 @app.route("/", methods=["GET"], strict_slashes=False)
@@ -45,11 +61,18 @@ def users() -> str:
 def login() -> str:
     """
     Log in user credentials provided if correct, and create a new
+    The password is checked by VERIFIER; a login it can't take in time
+    gets a 503, so a burst of logins doesn't hold every worker thread
     """
     email = request.form.get("email")
     password = request.form.get("password")
 
-    if not AUTH.valid_login(email, password):
+    try:
+        valid = AUTH.valid_login(email, password, VERIFIER.run)
+    except VerificationRejected:
+        return jsonify({"message": "too many logins, retry later"}), \
+            503, {"Retry-After": "1"}
+    if not valid:
         abort(401)
 
     session_id = AUTH.create_session(email)
@@ -2,24 +2,370 @@
 """
 Definition of utility functions and Auth class
 """
+import argparse
 import bcrypt
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from sqlalchemy.orm.exc import NoResultFound
-from typing import TypeVar, Union
+from typing import Callable, Iterable, List, Tuple, TypeVar, Union
 from db import DB
 from user import User
 
 U = TypeVar('User')
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+MIN_BCRYPT_ROUNDS = 10
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 1024))
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', 60))
 
 
-def _hash_password(password: str) -> bytes:
+def _hash_password(password: str, rounds: int = None) -> bytes:
     """
     Encrypt a password string and return the encrypted password as bytes.
     Args:
         password (str): the password in string format.
+        rounds (int): the bcrypt cost factor, BCRYPT_ROUNDS by default.
     """
     encoded_password = password.encode('utf-8')
-    return bcrypt.hashpw(encoded_password, bcrypt.gensalt())
+    return bcrypt.hashpw(encoded_password,
+                         bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
+
+
+def _hash_rounds(hashed_password: bytes) -> int:
+    """
+    Return the bcrypt cost factor of an encrypted password.
+    Args:
+        hashed_password (bytes): the password as $2b$<rounds>$<hash>.
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def _calibrate_rounds(target_ms: float,
+                      min_rounds: int = MIN_BCRYPT_ROUNDS,
+                      max_rounds: int = 31) -> int:
+    """
+    Find the highest bcrypt cost factor whose hash takes at most
+    target_ms milliseconds on this machine. Each round doubles the work,
+    so a few cheap hashes are timed and extrapolated.
+    The result depends on the load of the machine: run it once, on an
+    idle machine, and set BCRYPT_ROUNDS to it for every process, e.g.
+    with `python3 auth.py <target_ms>`.
+    Args:
+        target_ms (float): the time budget of one hash, in milliseconds.
+        min_rounds (int): the lowest cost factor returned.
+        max_rounds (int): the highest cost factor returned.
+    Return:
+        The cost factor.
+    """
+    probe_rounds = 8
+    samples = 5
+    salt = bcrypt.gensalt(probe_rounds)
+    start = time.perf_counter()
+    for _ in range(samples):
+        bcrypt.hashpw(b'calibration', salt)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / samples
+    rounds = probe_rounds
+    while rounds > min_rounds and elapsed_ms > target_ms:
+        rounds -= 1
+        elapsed_ms /= 2
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return max(rounds, min_rounds)
+
+
+def _hash_passwords(passwords: Iterable[str], workers: int = None,
+                    rounds: int = None) -> List[bytes]:
+    """
+    Encrypt many password strings on a pool of threads, which bcrypt
+    lets run in parallel as it releases the GIL while hashing.
+    Args:
+        passwords (Iterable[str]): the passwords in string format.
+        workers (int): the number of threads, one per CPU by default.
+        rounds (int): the bcrypt cost factor, BCRYPT_ROUNDS by default.
+    Return:
+        The encrypted passwords, in the order of the passwords.
+    """
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        return list(executor.map(
+            lambda password: _hash_password(password, rounds), passwords))
+
+
+def _verify_many(pairs: Iterable[Tuple[bytes, str]],
+                 workers: int = None) -> List[bool]:
+    """
+    Check many passwords against their encrypted passwords on a pool of
+    threads.
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): (encrypted password,
+        password) pairs.
+        workers (int): the number of threads, one per CPU by default.
+    Return:
+        Whether each password matches, in the order of the pairs.
+    """
+    def verify(pair: Tuple[bytes, str]) -> bool:
+        hashed_password, password = pair
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        return list(executor.map(verify, pairs))
+
+
+class VerificationRejected(Exception):
+    """Raised when the verification executor can't take a task in time."""
+
+
+class VerificationExecutor:
+    """
+    Bounded pool of threads running the password hashing and checking of
+    the requests, so they don't hold the threads serving other requests.
+    At most `workers` tasks run at a time. A task is admitted only if the
+    tasks ahead of it should be done within `max_wait_ms`, from the
+    average run time of the last tasks, so a rejected request returns at
+    once and an admitted one waits about `max_wait_ms` at most. A task
+    that still waited more than `max_wait_ms`, e.g. when submitted before
+    any run time was known, is rejected when it starts. `queue_size`,
+    when set, also caps the number of waiting tasks.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None,
+                 max_wait_ms: float = 1000) -> None:
+        """
+        Args:
+            workers (int): the number of threads, one per CPU by default.
+            queue_size (int): the most waiting tasks, no cap but the
+            expected wait by default.
+            max_wait_ms (float): the longest wait of a task, in ms.
+        """
+        self.workers = workers or os.cpu_count()
+        self.queue_size = queue_size
+        self.max_wait_ms = max_wait_ms
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._run_ms = None
+        self._stats = {
+            "submitted": 0,
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected_full": 0,
+            "rejected_wait": 0,
+            "rejected_timeout": 0,
+            "queue_ms_total": 0.0,
+            "queue_ms_max": 0.0,
+        }
+
+    def _count(self, key: str, queue_ms: float = None) -> None:
+        """
+        Update the counters of the executor.
+        """
+        with self._lock:
+            self._stats[key] += 1
+            if queue_ms is not None:
+                self._stats["queue_ms_total"] += queue_ms
+                self._stats["queue_ms_max"] = max(
+                    self._stats["queue_ms_max"], queue_ms)
+
+    def _expected_wait_ms(self) -> float:
+        """
+        Return how long a task submitted now should wait for a thread,
+        from the tasks ahead of it and the average run time of a task,
+        or None while no run time is known, with the lock held.
+        """
+        waiting = self._in_flight + 1 - self.workers
+        if waiting <= 0:
+            return 0.0
+        if self._run_ms is None:
+            return None
+        return waiting * self._run_ms / self.workers
+
+    def _admit(self) -> None:
+        """
+        Admit a new task, or raise VerificationRejected.
+        """
+        with self._lock:
+            waiting = self._in_flight + 1 - self.workers
+            expected_ms = self._expected_wait_ms()
+            if self.queue_size is not None and waiting > self.queue_size:
+                key = "rejected_full"
+            elif expected_ms is not None and expected_ms > self.max_wait_ms:
+                key = "rejected_wait"
+            else:
+                self._in_flight += 1
+                self._stats["submitted"] += 1
+                return
+            self._stats[key] += 1
+        raise VerificationRejected("verification queue {}".format(
+            "full" if key == "rejected_full" else "wait too long"))
+
+    def _done(self, run_ms: float = None) -> None:
+        """
+        Account for the end of a task, and for its run time if it ran.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if run_ms is not None:
+                if self._run_ms is None:
+                    self._run_ms = run_ms
+                else:
+                    self._run_ms = 0.8 * self._run_ms + 0.2 * run_ms
+
+    def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) on a thread of the executor and return its result.
+        Raise VerificationRejected if the task isn't expected to get a
+        thread within max_wait_ms, or if it still waited longer.
+        """
+        self._admit()
+        submitted = time.monotonic()
+
+        def task():
+            run_ms = None
+            try:
+                started = time.monotonic()
+                queue_ms = (started - submitted) * 1000
+                if queue_ms > self.max_wait_ms:
+                    self._count("rejected_timeout", queue_ms)
+                    raise VerificationRejected("verification queue timeout")
+                self._count("started", queue_ms)
+                try:
+                    result = fn(*args)
+                except Exception:
+                    self._count("failed")
+                    raise
+                run_ms = (time.monotonic() - started) * 1000
+                self._count("completed")
+                return result
+            finally:
+                self._done(run_ms)
+
+        return self._executor.submit(task).result()
+
+    def stats(self) -> dict:
+        """
+        Return the counters, the queue times and the average run time of
+        the executor.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["run_ms_avg"] = self._run_ms or 0.0
+        dequeued = stats["started"] + stats["rejected_timeout"]
+        stats["queue_ms_avg"] = \
+            stats.pop("queue_ms_total") / dequeued if dequeued else 0.0
+        return stats
+
+
+class SessionCache:
+    """
+    LRU cache of the users by session_id, so authenticated requests don't
+    query the database. It keeps detached copies of at most `size` users,
+    each for at most `ttl` seconds; a size of 0 disables it.
+    The cache is local to the process: the ttl bounds how long a session
+    destroyed by another process stays valid in this one.
+    """
+
+    def __init__(self, size: int = 1024, ttl: float = 60) -> None:
+        """
+        Args:
+            size (int): the number of cached sessions.
+            ttl (float): the lifetime of a cached session, in seconds.
+        """
+        self.size = size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._session_ids = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, session_id: str) -> Union[None, U]:
+        """
+        Return the cached user of session_id, or None on a miss.
+        """
+        with self._lock:
+            entry = self._users.get(session_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            user, expires = entry
+            if time.monotonic() >= expires:
+                self._pop(session_id)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._users.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return user
+
+    def generation(self) -> int:
+        """
+        Return the number of invalidations so far, to be read before
+        looking a user up in the database and passed to put.
+        """
+        return self._generation
+
+    def put(self, session_id: str, user: U, generation: int) -> None:
+        """
+        Cache a copy of the user of session_id, detached from the
+        database session, evicting the least recently used session when
+        the cache is full. The user isn't cached if a session was
+        invalidated since generation, as it may have been read before.
+        """
+        if self.size <= 0:
+            return
+        snapshot = User(**{column.name: getattr(user, column.name)
+                           for column in User.__table__.columns})
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pop(self._session_ids.get(user.id))
+            self._users[session_id] = (snapshot,
+                                       time.monotonic() + self.ttl)
+            self._session_ids[user.id] = session_id
+            while len(self._users) > self.size:
+                self._pop(next(iter(self._users)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drop the cached session of a user, if any. To be called once the
+        change of the user is committed.
+        """
+        with self._lock:
+            self._generation += 1
+            if self._pop(self._session_ids.get(user_id)):
+                self._stats["invalidations"] += 1
+
+    def _pop(self, session_id: str) -> bool:
+        """
+        Drop a cached session, with the lock held.
+        Return:
+            True if the session was cached, else False.
+        """
+        entry = self._users.pop(session_id, None)
+        if entry is None:
+            return False
+        del self._session_ids[entry[0].id]
+        return True
+
+    def stats(self) -> dict:
+        """
+        Return the counters and the size of the cache.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._users)
+        return stats
 
 
 def _generate_uuid() -> str:
@@ -33,7 +379,20 @@ class Auth:
     """Auth class for handling user authentication operations."""
 
     def __init__(self) -> None:
+        """
+        The cost factor of the new hashes is BCRYPT_ROUNDS.
+        """
         self._db_instance = DB()
+        self.session_cache = SessionCache(SESSION_CACHE_SIZE,
+                                          SESSION_CACHE_TTL)
+        self._rounds = BCRYPT_ROUNDS
+
+    def close_session(self) -> None:
+        """
+        Close the database session of the current thread, at the end of
+        a request.
+        """
+        self._db_instance.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -47,20 +406,29 @@ class Auth:
         try:
             self._db_instance.find_user_by(email=email)
         except NoResultFound:
-            hashed_password = _hash_password(password)
+            hashed_password = _hash_password(password, self._rounds)
             new_user = self._db_instance.add_user(email, hashed_password)
             return new_user
         raise ValueError(f"User {email} already exists")
 
-    def valid_login(self, email: str, password: str) -> bool:
+    def valid_login(self, email: str, password: str,
+                    run: Callable = None) -> bool:
         """
-        Validate a user's login credentials.
+        Validate a user's login credentials. A password hashed with
+        a lower cost factor than the configured one is hashed again and
+        saved once validated; hashes are never made weaker.
         Args:
             email (str): the user's email address.
             password (str): the user's password.
+            run (Callable): runs the hashing, as run(fn, *args), e.g.
+            VerificationExecutor.run; on the calling thread by default.
         Return:
             True if the credentials are correct, else False.
         """
+        if run is None:
+            def run(fn, *args):
+                return fn(*args)
+
         try:
             user = self._db_instance.find_user_by(email=email)
         except NoResultFound:
@@ -68,7 +436,18 @@ class Auth:
 
         user_hashed_password = user.hashed_password
         encoded_password = password.encode("utf-8")
-        return bcrypt.checkpw(encoded_password, user_hashed_password)
+        if not run(bcrypt.checkpw, encoded_password, user_hashed_password):
+            return False
+        if _hash_rounds(user_hashed_password) < self._rounds:
+            try:
+                hashed_password = run(_hash_password, password,
+                                      self._rounds)
+            except VerificationRejected:
+                return True
+            self._db_instance.update_user(user.id,
+                                          hashed_password=hashed_password)
+            self.session_cache.invalidate(user.id)
+        return True
 
     def create_session(self, email: str) -> Union[None, str]:
         """
@@ -86,11 +465,13 @@ class Auth:
 
         new_session_id = _generate_uuid()
         self._db_instance.update_user(user.id, session_id=new_session_id)
+        self.session_cache.invalidate(user.id)
         return new_session_id
 
     def get_user_from_session_id(self, session_id: str) -> Union[None, U]:
         """
         Retrieve a user by session_id, if one exists, else return None.
+        The user comes from the session cache when cached there.
         Args:
             session_id (str): the session id for user.
         Return:
@@ -99,11 +480,16 @@ class Auth:
         if session_id is None:
             return None
 
+        user = self.session_cache.get(session_id)
+        if user is not None:
+            return user
+        generation = self.session_cache.generation()
         try:
             user = self._db_instance.find_user_by(session_id=session_id)
         except NoResultFound:
             return None
 
+        self.session_cache.put(session_id, user, generation)
         return user
 
     def destroy_session(self, user_id: int) -> None:
@@ -118,6 +504,8 @@ class Auth:
             self._db_instance.update_user(user_id, session_id=None)
         except ValueError:
             return None
+        finally:
+            self.session_cache.invalidate(user_id)
         return None
 
     def get_reset_password_token(self, email: str) -> str:
@@ -151,10 +539,25 @@ class Auth:
         except NoResultFound:
             raise ValueError()
 
-        hashed_password = _hash_password(password)
+        hashed_password = _hash_password(password, self._rounds)
         hp = hashed_password
         self._db_instance.update_user(
             user.id,
             hashed_password=hp,
             reset_token=None
         )
+        self.session_cache.invalidate(user.id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="prints the highest bcrypt cost factor whose hash "
+                    "takes at most target_ms milliseconds on this machine, "
+                    "to be set as BCRYPT_ROUNDS")
+    parser.add_argument("target_ms", type=float,
+                        help="the time budget of one hash, in ms")
+    parser.add_argument("--min-rounds", type=int, default=MIN_BCRYPT_ROUNDS,
+                        help="the lowest cost factor printed")
+    args = parser.parse_args()
+    print("BCRYPT_ROUNDS={}".format(
+        _calibrate_rounds(args.target_ms, args.min_rounds)))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Bulk import of users from a CSV file with email and password columns
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import warnings
+from typing import Callable, Iterator, List, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from auth import _hash_passwords
+from db import DB
+
+
+def _read_batches(path: str, batch_size: int,
+                  skip: int) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+    """
+    Stream the (email, password) rows of a CSV file, batch_size at a time.
+    Args:
+        path (str): the CSV file, with a header naming email and password.
+        batch_size (int): the number of rows of a batch.
+        skip (int): the number of rows already imported.
+    Return:
+        The number of rows read so far and the rows of each batch.
+    """
+    with open(path, newline="") as f:
+        rows_read = 0
+        batch = []
+        for row in csv.DictReader(f):
+            rows_read += 1
+            if rows_read <= skip:
+                continue
+            batch.append((row.get("email") or "", row.get("password") or ""))
+            if len(batch) >= batch_size:
+                yield rows_read, batch
+                batch = []
+        if batch:
+            yield rows_read, batch
+
+
+def _file_version(path: str) -> str:
+    """
+    Return the size and the modification time of a file.
+    """
+    stat = os.stat(path)
+    return "{} {}".format(stat.st_size, stat.st_mtime_ns)
+
+
+def _read_checkpoint(checkpoint: str, path: str) -> int:
+    """
+    Return the number of rows of path already imported according to the
+    checkpoint, or 0 when there's none or it was written for another
+    version of the file.
+    """
+    if not os.path.exists(checkpoint):
+        return 0
+    with open(checkpoint) as f:
+        rows, _, version = f.read().strip().partition(" ")
+    if version != _file_version(path):
+        warnings.warn("{} doesn't match {}, which changed since; importing "
+                      "it from the start".format(checkpoint, path))
+        return 0
+    return int(rows)
+
+
+def import_users(db: DB, path: str, batch_size: int = 1000,
+                 workers: int = None, rounds: int = None,
+                 checkpoint: str = None,
+                 progress: Callable = None) -> dict:
+    """
+    Import the users of a CSV file. Each batch is deduplicated against
+    itself and the database with set-based queries, its passwords are
+    hashed in parallel, and it's inserted in a single transaction.
+    The number of rows imported is saved to checkpoint after each batch,
+    with the size and modification time of the file, so an interrupted
+    import of the same file resumes where it stopped; emails already in
+    the database are skipped anyway. The checkpoint is deleted once the
+    whole file is imported.
+    Args:
+        db (DB): the database to import into.
+        path (str): the CSV file, with a header naming email and password.
+        batch_size (int): the number of rows per transaction.
+        workers (int): the number of hashing threads, one per CPU by
+        default.
+        rounds (int): the bcrypt cost factor, BCRYPT_ROUNDS by default.
+        checkpoint (str): the progress file, <path>.progress by default.
+        progress (Callable): called with the stats after each batch.
+    Return:
+        The number of rows read, imported, skipped as duplicates or
+        invalid, and the rows per second.
+    """
+    checkpoint = checkpoint or path + ".progress"
+    skip = _read_checkpoint(checkpoint, path)
+    version = _file_version(path)
+    stats = {"read": skip, "imported": 0, "duplicates": 0, "invalid": 0,
+             "rows_per_second": 0.0}
+    start = time.perf_counter()
+    for rows_read, batch in _read_batches(path, batch_size, skip):
+        passwords = {}
+        for email, password in batch:
+            if not email or not password:
+                stats["invalid"] += 1
+            elif email in passwords:
+                stats["duplicates"] += 1
+            else:
+                passwords[email] = password
+        for attempt in range(2):
+            existing = db.existing_emails(passwords)
+            new = [email for email in passwords if email not in existing]
+            hashed = _hash_passwords([passwords[email] for email in new],
+                                     workers, rounds)
+            try:
+                db.add_users(list(zip(new, hashed)))
+                break
+            except IntegrityError:
+                if attempt == 1:
+                    raise
+        stats["duplicates"] += len(passwords) - len(new)
+        stats["imported"] += len(new)
+        stats["read"] = rows_read
+        with open(checkpoint, "w") as f:
+            f.write("{} {}".format(rows_read, version))
+        elapsed = time.perf_counter() - start
+        stats["rows_per_second"] = (rows_read - skip) / elapsed \
+            if elapsed > 0 else 0.0
+        if progress is not None:
+            progress(stats)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return stats
+
+
+def main() -> None:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="imports users from a CSV file with email and "
+                    "password columns")
+    parser.add_argument("path", help="the CSV file")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="rows per transaction")
+    parser.add_argument("--workers", type=int,
+                        help="hashing threads, one per CPU by default")
+    parser.add_argument("--rounds", type=int,
+                        help="bcrypt cost factor, BCRYPT_ROUNDS by default")
+    parser.add_argument("--checkpoint",
+                        help="progress file, <path>.progress by default")
+    args = parser.parse_args()
+
+    def report(stats: dict) -> None:
+        print("{read} rows read, {imported} imported, {duplicates} "
+              "duplicates, {invalid} invalid, {rows_per_second:.0f} "
+              "rows/s".format(**stats), file=sys.stderr)
+
+    import_users(DB(), args.path, args.batch_size, args.workers,
+                 args.rounds, args.checkpoint, report)
+
+
+if __name__ == "__main__":
+    main()
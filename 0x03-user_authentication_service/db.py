@@ -2,37 +2,176 @@
 """
 Module for database operations
 """
-from sqlalchemy import create_engine
+import os
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import (
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    Table,
+    create_engine,
+    event,
+    inspect
+)
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.pool import QueuePool
 
 from user import Base, User
 
+# the version of the schema the code expects; a migration brings the
+# database from the previous version to its version
+SCHEMA_VERSION = 2
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, nullable=False)
+)
+
+
+def _create_tables(connection: Connection) -> None:
+    """
+    Migration 1: creates the tables that are missing
+    """
+    Base.metadata.create_all(connection)
+
+
+def _create_user_indexes(connection: Connection) -> None:
+    """
+    Migration 2: indexes users.email (unique), users.session_id and
+    users.reset_token in databases created without them
+    """
+    inspector = inspect(connection)
+    indexed = [index["column_names"] for index in
+               inspector.get_indexes("users")]
+    indexed += [constraint["column_names"] for constraint in
+                inspector.get_unique_constraints("users")]
+    for column, unique in (("email", True), ("session_id", False),
+                           ("reset_token", False)):
+        if [column] not in indexed:
+            Index("ix_users_{}".format(column), User.__table__.c[column],
+                  unique=unique).create(connection)
+
+
+MIGRATIONS = [
+    (1, _create_tables),
+    (2, _create_user_indexes),
+]
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Switches a new SQLite connection to WAL, so readers don't wait for
+    the writer
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 
 class DB:
     """Class for database operations
+
+    The schema is created or migrated, never dropped, unless DB_RESET is
+    set. Each thread gets its own session; the app removes it at the end
+    of each request. The engine keeps a pool of DB_POOL_SIZE connections
+    (default 5), plus DB_MAX_OVERFLOW (default 10) under load, checked
+    before use and recycled after DB_POOL_RECYCLE seconds (default 3600)
     """
 
     def __init__(self) -> None:
         """Constructor for DB class
         """
-        self._engine = create_engine("sqlite:///a.db",
-                                     echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        url = os.getenv("DB_URL", "sqlite:///a.db")
+        options = {}
+        if url.startswith("sqlite"):
+            options["poolclass"] = QueuePool
+            options["connect_args"] = {"check_same_thread": False,
+                                       "timeout": 30}
+        self._engine = create_engine(
+            url,
+            echo=False,
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1") in
+            ("1", "true", "True"),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 3600)),
+            **options
+        )
+        if url.startswith("sqlite"):
+            event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        if os.getenv("DB_RESET") in ("1", "true", "True"):
+            Base.metadata.drop_all(self._engine)
+            schema_version.drop(self._engine, checkfirst=True)
+        self._init_schema()
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+
+    @staticmethod
+    def _schema_version(connection: Connection) -> int:
+        """
+        Returns the version of the schema of the database, 0 if it was
+        never versioned
+        """
+        if not inspect(connection).has_table("schema_version"):
+            return 0
+        version = connection.execute(schema_version.select()).scalar()
+        return version or 0
+
+    def _init_schema(self) -> None:
+        """
+        Brings the schema of the database to SCHEMA_VERSION, without
+        touching the data: when the database is up to date, which is the
+        case of every start but the first, it only reads the version;
+        otherwise the missing migrations are applied in one transaction,
+        which SQLite takes with BEGIN IMMEDIATE, so workers starting
+        together migrate one after the other
+        """
+        with self._engine.connect() as connection:
+            if self._schema_version(connection) >= SCHEMA_VERSION:
+                return
+        with self._engine.connect() as connection:
+            with connection.begin():
+                if self._engine.dialect.name == "sqlite":
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                version = self._schema_version(connection)
+                for migration_version, migrate in MIGRATIONS:
+                    if migration_version > version:
+                        migrate(connection)
+                if version < SCHEMA_VERSION:
+                    schema_version.create(connection, checkfirst=True)
+                    connection.execute(schema_version.delete())
+                    connection.execute(schema_version.insert().values(
+                        version=SCHEMA_VERSION))
 
     @property
     def _session(self) -> Session:
-        """Property for session object
+        """Property for the session object of the current thread
+        """
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """
+        Closes the session of the current thread, rolling back what it
+        didn't commit, and gives its connection back to the pool
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
+
+    def _commit(self) -> None:
+        """
+        Commits the session of the current thread, or rolls it back if
+        the commit fails
+        """
+        try:
+            self._session.commit()
+        except BaseException:
+            self._session.rollback()
+            raise
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """
@@ -45,25 +184,56 @@ class DB:
         """
         user_instance = User(email=email, hashed_password=hashed_password)
         self._session.add(user_instance)
-        self._session.commit()
+        self._commit()
         return user_instance
 
+    def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """
+        Finds which of the emails are already used, 500 emails per query
+        Args:
+            emails (Iterable[str]): The emails to look up
+        Return:
+            The emails of existing users
+        """
+        emails = list(emails)
+        found = set()
+        for i in range(0, len(emails), 500):
+            found.update(email for (email,) in self._session.query(
+                User.email).filter(User.email.in_(emails[i:i + 500])))
+        return found
+
+    def add_users(self, users: List[Tuple[str, str]]) -> None:
+        """
+        Adds many users to the database in a single transaction
+        Args:
+            users (list): The (email, hashed_password) of the users
+        Return:
+            None
+        """
+        self._session.bulk_insert_mappings(User, [
+            {"email": email, "hashed_password": hashed_password}
+            for email, hashed_password in users
+        ])
+        self._commit()
+
     def find_user_by(self, **kwargs) -> User:
         """
-        Finds a user by matching attributes
+        Finds a user by matching attributes, in a single query filtered
+        on all of them and limited to one row
         Args:
             attributes (dict): The attributes to match the user
         Return:
             The matching user or an error
         """
-        all_users = self._session.query(User)
-        for attribute, value in kwargs.items():
+        if not kwargs:
+            raise NoResultFound
+        for attribute in kwargs:
             if attribute not in User.__dict__:
                 raise InvalidRequestError
-            for user in all_users:
-                if getattr(user, attribute) == value:
-                    return user
-        raise NoResultFound
+        user = self._session.query(User).filter_by(**kwargs).first()
+        if user is None:
+            raise NoResultFound
+        return user
 
     def update_user(self, user_id: int, **kwargs) -> None:
         """
@@ -82,5 +252,6 @@ class DB:
             if hasattr(user, attribute):
                 setattr(user, attribute, value)
             else:
+                self._session.rollback()
                 raise ValueError
-        self._session.commit()
+        self._commit()
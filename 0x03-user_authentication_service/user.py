@@ -24,14 +24,14 @@ class User(Base):
     # it is an integer and can not be null nor repeated (primary_key)
     id = Column(Integer, primary_key=True)
     # the email attribute is a column of the table
-    # it is a string, can not be empty
-    email = Column(String(250), nullable=False)
+    # it is a string, can not be empty, and is unique and indexed
+    email = Column(String(250), nullable=False, unique=True)
     # the hashed_password attribute is a column of the table
     # it is a string, can not be empty
     hashed_password = Column(String(250), nullable=False)
     # the session_id attribute is a column of the table
-    # it is a string, can be empty
-    session_id = Column(String(250), nullable=True)
+    # it is a string, can be empty, and is indexed
+    session_id = Column(String(250), nullable=True, index=True)
     # the reset_token attribute is a column of the table
-    # it is a string, can be empty
-    reset_token = Column(String(250), nullable=True)
+    # it is a string, can be empty, and is indexed
+    reset_token = Column(String(250), nullable=True, index=True)